@@ -6,15 +6,11 @@
 
 import sys
 
-import src.gui
-
-def usage():
-    print './bp.py : Backpropagation for predictions'
-
 if __name__ == '__main__':
     if len(sys.argv) == 1:
-       src.gui.main()
+        import src.gui
+        src.gui.main()
     else:
-        usage()
-
-
+        # no GUI (nor display) needed on the command line
+        import src.cli
+        sys.exit(src.cli.main(sys.argv[1:]))
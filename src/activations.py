@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Activation functions.
+
+Each activation gives, for the weighted sum s of the inputs of a neuron, the
+output v of the neuron and the factor used when learning from the error of
+the neuron. The factor depends only on the output, so it is computed once
+for each neuron and pattern, together with the output, and is then used for
+all the weights of the neuron.
+
+For the original functions (log, 2log and tanh) the factor is their
+derivative applied to the output, as it always was in this program; the
+newer ones use their real derivative, written as a function of the output.
+
+There are scalar versions (used by the object graph in units.py) and array
+versions (used by the vectorized engine, need numpy). New activations are
+added by subclassing Activation and calling register.
+"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # only the scalar versions can be used
+
+class Activation(object):
+    """
+    An activation function. Subclasses define output, factor, outputs and
+    factors and may give a faster version of the *_and_factor* methods.
+    """
+
+    name = None # name used in the configuration
+    title = None # label shown in the GUI
+    domain = (-1, 1) # range of the outputs, where the data is normalized
+
+    def output(self, s):
+        """
+        Returns the output for the weighted sum s.
+        """
+        raise NotImplementedError
+
+    def factor(self, v):
+        """
+        Returns the learning factor for the output v.
+        """
+        raise NotImplementedError
+
+    def output_and_factor(self, s):
+        """
+        Returns (output, learning factor) for the weighted sum s.
+        """
+        v = self.output(s)
+        return (v, self.factor(v))
+
+    def outputs(self, s):
+        """
+        Array version of output.
+        """
+        raise NotImplementedError
+
+    def factors(self, v):
+        """
+        Array version of factor.
+        """
+        raise NotImplementedError
+
+    def outputs_and_factors(self, s):
+        """
+        Array version of output_and_factor.
+        """
+        v = self.outputs(s)
+        return (v, self.factors(v))
+
+class Logistic(Activation):
+    """
+    Normal logistic function. Output in [0, 1].
+    """
+    name = 'log'
+    title = 'Simple logistic'
+    domain = (0, 1)
+
+    def output(self, s):
+        return 1 / (1 + math.exp(-s))
+
+    def factor(self, v):
+        l = 1 / (1 + math.exp(-v))
+        return l * (1 - l)
+
+    def outputs(self, s):
+        return 1 / (1 + numpy.exp(-s))
+
+    def factors(self, v):
+        l = 1 / (1 + numpy.exp(-v))
+        return l * (1 - l)
+
+class Logistic2(Activation):
+    """
+    Logistic function with output in [-1, 1].
+    """
+    name = '2log'
+    title = 'Logistic in [-1, 1]'
+
+    def output(self, s):
+        return 1 - 2 * (1 / (1 + math.exp(-s)))
+
+    def factor(self, v):
+        l = 1 / (1 + math.exp(-v))
+        return -2 * l * (1 - l)
+
+    def outputs(self, s):
+        return 1 - 2 * (1 / (1 + numpy.exp(-s)))
+
+    def factors(self, v):
+        l = 1 / (1 + numpy.exp(-v))
+        return -2 * l * (1 - l)
+
+class Tanh(Activation):
+    """
+    tanh function.
+    """
+    name = 'tanh'
+    title = 'Tanh'
+
+    def output(self, s):
+        return math.tanh(s)
+
+    def factor(self, v):
+        t = math.tanh(v)
+        return 1 - t * t
+
+    def outputs(self, s):
+        return numpy.tanh(s)
+
+    def factors(self, v):
+        t = numpy.tanh(v)
+        return 1 - t * t
+
+class ReLU(Activation):
+    """
+    Rectified linear function: negative sums are cut to 0.
+    """
+    name = 'relu'
+    title = 'ReLU'
+    domain = (0, 1)
+    slope = 0 # slope for negative sums
+
+    def output(self, s):
+        return s if s > 0 else self.slope * s
+
+    def factor(self, v):
+        return 1 if v > 0 else self.slope
+
+    def outputs(self, s):
+        return numpy.where(s > 0, s, self.slope * s)
+
+    def factors(self, v):
+        return numpy.where(v > 0, 1., self.slope)
+
+    def outputs_and_factors(self, s):
+        p = s > 0
+        return (numpy.where(p, s, self.slope * s),
+                numpy.where(p, 1., self.slope))
+
+class LeakyReLU(ReLU):
+    """
+    Rectified linear function with a small slope for negative sums.
+    """
+    name = 'leaky'
+    title = 'Leaky ReLU'
+    slope = .01
+
+class Softsign(Activation):
+    """
+    Softsign function, s / (1 + |s|). Output in [-1, 1].
+    """
+    name = 'softsign'
+    title = 'Softsign'
+
+    def output(self, s):
+        return s / (1 + abs(s))
+
+    def factor(self, v):
+        d = 1 - abs(v) # = 1 / (1 + |s|)
+        return d * d
+
+    def outputs(self, s):
+        return s / (1 + numpy.abs(s))
+
+    def factors(self, v):
+        d = 1 - numpy.abs(v)
+        return d * d
+
+# all known activations, by name, in the order shown in the GUI
+ACTIVATIONS = {}
+NAMES = []
+
+def register(activation):
+    """
+    Makes an activation (an Activation instance) available by its name.
+    """
+    if activation.name not in ACTIVATIONS:
+        NAMES.append(activation.name)
+    ACTIVATIONS[activation.name] = activation
+
+def get(name):
+    """
+    Returns the activation with the given name.
+    """
+    try:
+        return ACTIVATIONS[name]
+    except KeyError:
+        raise ValueError("Unknown activation function {0}".format(name))
+
+register(Logistic())
+register(Logistic2())
+register(Tanh())
+register(ReLU())
+register(LeakyReLU())
+register(Softsign())
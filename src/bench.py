@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Benchmarks of the learning, headless and with fixed seeds.
+
+Each series from the fixtures (test/*/input.txt) is learnt with a few
+topologies (the one of its best_so_far results and any other requested) and
+each engine, measuring the learning steps per second, the time until the RMS
+reaches a target (by default the final RMS of best_so_far), the peak memory
+and how far the results are from best_so_far. Then, to show how the learning
+scales, the first series is stretched to longer synthetic series and learnt
+by bigger networks, for a few steps.
+
+Every case runs in a new process, so that its peak memory is its own. The
+results are returned as a dictionary which can be dumped as JSON.
+
+The engines can also be checked against each other: a series is learnt with
+the same seed by each of them in a few configurations and the final RMS and
+forecast must be the ones of the object engine.
+"""
+
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import time
+
+import network
+import settings
+
+from globaldefs import *
+
+SEED = 42
+RUNS = 1000 # learning steps for the fixtures
+SCALE_RUNS = 5 # learning steps for the synthetic series
+SCALE_LENGTHS = (100, 1000, 5000)
+SCALE_SIZES = (4, 8, 16) # N and h1 (h2 is half of it)
+NOISE = .01 # of the range of the values, added to the synthetic series
+CHECK_RUNS = 1000 # learning steps for the check of the engines
+CHECK_TOLERANCE = 1e-9 # relative, for the vectorized engine
+# configurations in which the engines are checked (the options changed)
+CHECKS = (
+        ('plain', {}),
+        ('momentum', {'momentum': True}),
+        ('recurrent', {'recurrent': True}),
+        ('outputs', {'outputs': 2, 'horizon': 2}),
+        ('validation', {'validation': .2}),
+        )
+
+def fixtures(where, name='input.txt'):
+    """
+    Returns the directories of the fixtures found in where: the ones with a
+    series (called name) and its best_so_far results.
+    """
+    found = []
+    for d in sorted(os.listdir(where)):
+        d = os.path.join(where, d)
+        if os.path.isfile(os.path.join(d, name)) and \
+                os.path.isdir(os.path.join(d, 'best_so_far')):
+            found.append(d)
+    return found
+
+def read_best(d, name='input.txt'):
+    """
+    Reads the best_so_far results of a fixture.
+
+    return  dictionary with the topology of the network ('topology', as
+            (N, h1, h2)), the final RMS ('rms') and the predicted value
+            ('predicted'); None for the ones which couldn't be read
+    """
+    base = os.path.join(d, 'best_so_far', name)
+    best = {'topology': None, 'rms': None, 'predicted': None}
+    try:
+        with open(base + NETWORK_MATRIX_SUFFIX) as f:
+            f.readline()
+            names = f.readline().replace('|', ' ').split()
+        best['topology'] = (
+                len([n for n in names if n.startswith('i')]),
+                len([n for n in names if n.startswith('h1')]),
+                len([n for n in names if n.startswith('h2')]))
+    except IOError:
+        pass
+    try:
+        with open(base + RMS_FILE_SUFFIX) as f:
+            best['rms'] = float(f.readlines()[-1].split()[1])
+    except (IOError, IndexError, ValueError):
+        pass
+    try:
+        with open(base + VAL_SUFFIX) as f:
+            best['predicted'] = float(f.readlines()[-1].split()[2])
+    except (IOError, IndexError, ValueError):
+        pass
+    return best
+
+def stretch(data, length, seed=SEED):
+    """
+    Builds a synthetic series of the given length with the shape of data:
+    the values are linearly interpolated and some noise is added.
+    """
+    rnd = random.Random(seed)
+    noise = NOISE * ((max(data) - min(data)) or 1)
+    series = []
+    for i in range(length):
+        x = float(i) * (len(data) - 1) / max(length - 1, 1)
+        j = min(int(x), len(data) - 2)
+        v = data[j] + (x - j) * (data[j + 1] - data[j])
+        series.append(v + rnd.gauss(0, noise))
+    return series
+
+def run_case(case):
+    """
+    Learns a series for one case of the benchmark. Runs in its own process.
+
+    case    dictionary with the configuration ('config'), the target RMS
+            ('target', None for none) and what describes the case, copied
+            to the result
+    return  the result of the case
+    """
+    config = case['config']
+    result = dict((k, v) for (k, v) in case.items() if k != 'config')
+    random.seed(SEED)
+    start = time.time()
+    nw = network.Network(config, None, None)
+    built = time.time()
+    reached = None
+    done = False
+    while not done:
+        done = nw.learn_epoch()
+        if reached is None and case['target'] is not None and \
+                nw.rms()[-1] <= case['target']:
+            reached = time.time() - built
+    learnt = time.time()
+    r = nw.finish()
+
+    steps = len(nw.rms())
+    result.update({
+        'steps': steps,
+        'build_seconds': built - start,
+        'learn_seconds': learnt - built,
+        'steps_per_second': steps / (learnt - built) if learnt > built else None,
+        'seconds_to_target': reached,
+        'rms': r['err'],
+        'predicted': r['predicted'],
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+    return result
+
+def _config(data, topology, engine, runs, batch):
+    """
+    Returns the configuration of a case: learning for the given number of
+    steps (there's no minimum error), without writing anything.
+    """
+    config = dict(settings.DEFAULTS)
+    config['N'], config['h1'], config['h2'] = topology
+    config.update({'baseName': None, 'data': data, 'engine': engine,
+        'runs': runs, 'batch': batch if engine == 'numpy' else 1,
+        'min_rms': 0, 'min_delta_rms': 0})
+    return config
+
+def cases(where, topologies=(), engines=settings.ENGINES, runs=RUNS,
+        batch=1, target=None, lengths=SCALE_LENGTHS, sizes=SCALE_SIZES,
+        scale_runs=SCALE_RUNS):
+    """
+    Builds the cases of the benchmark.
+
+    where       directory with the fixtures
+    topologies  (N, h1, h2) learnt for each fixture, besides the one of its
+                best_so_far results
+    engines     engines used for each case
+    runs        learning steps for the fixtures
+    batch       patterns per weight update for the vectorized engine
+    target      RMS whose reaching is timed (None for the final RMS of
+                best_so_far)
+    lengths     lengths of the synthetic series
+    sizes       sizes of the networks learning the synthetic series
+    scale_runs  learning steps for the synthetic series
+    return      (cases for the fixtures, cases for the synthetic series)
+    """
+    if not network.engine:
+        engines = [e for e in engines if e != 'numpy']
+    found = fixtures(where)
+    fixed = []
+    for d in found:
+        data = settings.read_data(os.path.join(d, 'input.txt'))
+        best = read_best(d)
+        tops = [best['topology']] if best['topology'] else []
+        tops += [t for t in topologies if t not in tops]
+        for t in tops:
+            if t[0] >= len(data):
+                continue # series too short for the order
+            for e in engines:
+                fixed.append({'config': _config(data, t, e, runs, batch),
+                    'fixture': d, 'topology': t, 'engine': e,
+                    'target': best['rms'] if target is None else target,
+                    'best_rms': best['rms'],
+                    'best_predicted': best['predicted']})
+
+    scaled = []
+    if found:
+        data = settings.read_data(os.path.join(found[0], 'input.txt'))
+        for l in lengths:
+            for s in sizes:
+                t = (s, s, s / 2)
+                for e in engines:
+                    scaled.append({'config': _config(stretch(data, l), t, e,
+                        scale_runs, batch), 'fixture': found[0], 'length': l,
+                        'topology': t, 'engine': e, 'target': None})
+    return (fixed, scaled)
+
+def _compare(result):
+    """
+    Adds to the result of a fixture case how far it is from best_so_far.
+    """
+    b = result['best_rms']
+    result['rms_ratio'] = result['rms'] / b if b else None
+    b = result['best_predicted']
+    result['predicted_error'] = abs(result['predicted'] - b) \
+            if b is not None else None
+    return result
+
+def _revision():
+    """
+    Returns the git revision of the sources, None if unknown.
+    """
+    try:
+        p = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out = p.communicate()[0].strip()
+    except OSError:
+        return None
+    return out if p.returncode == 0 else None
+
+def run(fixed, scaled, progress=None):
+    """
+    Runs the cases of the benchmark, one at a time (each in a new process).
+
+    progress    called with each result, as soon as it is known
+    return      dictionary with the environment ('meta'), the results of
+                the fixtures ('fixtures') and of the synthetic series
+                ('scaling')
+    """
+    numpy = None
+    if network.engine:
+        numpy = network.engine.numpy.__version__
+    meta = {'revision': _revision(), 'python': platform.python_version(),
+            'numpy': numpy, 'platform': platform.platform(), 'seed': SEED,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+    results = []
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    for r in pool.imap(run_case, fixed + scaled):
+        if progress:
+            progress(r)
+        results.append(r)
+    pool.close()
+    pool.join()
+
+    return {'meta': meta,
+            'fixtures': [_compare(r) for r in results[:len(fixed)]],
+            'scaling': results[len(fixed):]}
+
+def check(d, engines=settings.ENGINES, runs=CHECK_RUNS,
+        tolerance=CHECK_TOLERANCE):
+    """
+    Checks that the engines learn the same: the series of a fixture is
+    learnt with the same seed by each engine, in each configuration of
+    CHECKS, with the topology of its best_so_far results. The final RMS and
+    the forecast must be exactly the ones of the object engine for the lean
+    engine and the same up to the relative tolerance for the vectorized one
+    (which adds in another order).
+
+    d           directory of the fixture
+    engines     engines checked against the object engine
+    runs        learning steps
+    tolerance   relative tolerance for the vectorized engine
+    return      list of (configuration, engine, RMS, forecast, True if the
+                results are the expected ones)
+    """
+    if not network.engine:
+        engines = [e for e in engines if e != 'numpy']
+    data = settings.read_data(os.path.join(d, 'input.txt'))
+    topology = read_best(d)['topology'] or \
+            tuple(settings.DEFAULTS[k] for k in ('N', 'h1', 'h2'))
+    results = []
+    for (name, options) in CHECKS:
+        expected = None
+        for e in ['units'] + [e for e in engines if e != 'units']:
+            config = _config(data, topology, e, runs, 1)
+            config.update(options)
+            random.seed(SEED)
+            nw = network.Network(config, None, None)
+            while not nw.learn_epoch():
+                pass
+            r = nw.finish()
+            got = [r['err']] + list(r['forecast'])
+            if expected is None:
+                expected = got
+            if e == 'numpy':
+                ok = all(abs(g - x) <= tolerance * max(abs(x), 1)
+                        for (g, x) in zip(got, expected))
+            else:
+                ok = got == expected
+            results.append((name, e, r['err'], r['forecast'], ok))
+    return results
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Checkpoints of a long learning: the whole state of the network (see
+Network.state), saved periodically so that an interrupted learning can be
+resumed from the last one.
+"""
+
+import cPickle as pickle
+import os
+import time
+
+import saver
+
+VERSION = 1
+
+def save(fName, state):
+    """
+    Writes a checkpoint. The file is replaced only when the new checkpoint
+    is completely written, so there's always a valid one.
+    """
+    tmp = fName + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(dict(state, version=VERSION), f, pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp, fName)
+
+def load(fName):
+    """
+    Reads a checkpoint, returning the state of the network.
+    """
+    try:
+        with open(fName, 'rb') as f:
+            state = pickle.load(f)
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        state = None
+    if not isinstance(state, dict) or state.get('version') != VERSION:
+        raise ValueError("{0} is not a checkpoint".format(fName))
+    return state
+
+class Checkpointer(object):
+    """
+    Saves checkpoints of a network every few steps or seconds. The state is
+    copied in the learning thread, the file is written in the background
+    (by the writers of saver.py).
+    """
+
+    def __init__(self, fName, steps=0, seconds=0):
+        """
+        fName       name of the checkpoint file
+        steps       number of steps between checkpoints (0 = no limit)
+        seconds     number of seconds between checkpoints (0 = no limit)
+        """
+        self._fName = fName
+        self._steps = steps
+        self._seconds = seconds
+        self._count = 0
+        self._last = time.time()
+        self._pending = None
+
+    def step(self, nw):
+        """
+        Called after each learning step of the network, saves a checkpoint
+        if one is due. If the previous one is still being written, the new
+        one is delayed to the next step instead of waiting.
+        """
+        self._count += 1
+        due = self._steps and self._count >= self._steps
+        due = due or (self._seconds and time.time() - self._last >= self._seconds)
+        if not due or (self._pending and not self._pending.ready()):
+            return
+        self._count = 0
+        self._last = time.time()
+        self._pending = saver.submit(save, self._fName, nw.state())
+
+    def close(self, remove=False):
+        """
+        Waits for the last checkpoint to be written and, if remove is True
+        (the learning is finished), removes it.
+        """
+        if self._pending:
+            self._pending.wait()
+        if remove and os.path.exists(self._fName):
+            os.remove(self._fName)
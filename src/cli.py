@@ -0,0 +1,611 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+# Command line interface: learning without the GUI (and without a display).
+#
+
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+import activations
+import bench
+import checkpoint
+import model
+import network
+import online
+import profiling
+import saver
+import search
+import settings
+
+from globaldefs import *
+
+def train(config, state=None):
+    """
+    Trains a network for the given configuration until it stops learning,
+    saving everything like the GUI does (except the network image). The
+    files are written in the background, see saver.wait.
+
+    state   state of the network to resume from (see Network.state)
+    return  the result of the learning: {'predicted':..., 'err':...}
+    """
+    nw = network.Network(config, None, None, state)
+    r = None
+    while not r:
+        r = nw.learn_step()
+    return r
+
+def find_inputs(where, name):
+    """
+    Finds the series to learn: all files called name from a directory (and
+    its subdirectories) or all files matching a glob pattern.
+    """
+    if os.path.isdir(where):
+        found = []
+        for (d, dirs, files) in os.walk(where):
+            dirs.sort()
+            if name in files:
+                found.append(os.path.join(d, name))
+        return found
+    return sorted(glob.glob(where))
+
+def build_config(args, fName):
+    """
+    Builds the same configuration dictionary as config.Config does, from the
+    command line arguments, for the series read from fName.
+
+    return  the dictionary or None if there is an error (already reported)
+    """
+    data = settings.read_data(fName)
+    if data is None:
+        _report(True, "Invalid file {0}!".format(fName))
+        return None
+    return _check_config(args, fName, data)
+
+def _check_config(args, fName, data):
+    """
+    Builds and checks the configuration for the given series.
+
+    return  the dictionary or None if there is an error (already reported)
+    """
+    config = dict((k, getattr(args, k)) for k in settings.DEFAULTS)
+    config['baseName'] = fName
+    config['data'] = data
+
+    ok = True
+    for (fatal, text) in settings.check_config(config):
+        _report(fatal, text)
+        ok = ok and not fatal
+    return config if ok else None
+
+def _report(fatal, text):
+    """
+    Reports an error or a warning.
+    """
+    sys.stderr.write('{0}: {1}\n'.format('Error' if fatal else 'Warning', text))
+
+def _resume_state(args, config):
+    """
+    Returns the state saved in the checkpoint of the series, if resuming
+    was requested and there is one, None otherwise. Raises ValueError if the
+    checkpoint is invalid.
+    """
+    fName = config['baseName'] + CHECKPOINT_SUFFIX
+    if not args.resume or not os.path.exists(fName):
+        return None
+    return checkpoint.load(fName)
+
+def _wait_saved():
+    """
+    Waits for the results to be written, reporting the failures.
+    """
+    for text in saver.wait():
+        _report(False, text)
+
+def _add_config_arguments(parser):
+    """
+    Adds the arguments for the network configuration, the same options as in
+    the configuration dialog.
+    """
+    d = settings.DEFAULTS
+    parser.add_argument('--runs', type=int, default=d['runs'],
+            help='maximum number of learning steps')
+    parser.add_argument('--N', type=int, default=d['N'],
+            help='order of the series (number of inputs)')
+    parser.add_argument('--h1', type=int, default=d['h1'],
+            help='neurons in the first hidden layer')
+    parser.add_argument('--h2', type=int, default=d['h2'],
+            help='neurons in the second hidden layer')
+    parser.add_argument('--activation', choices=activations.NAMES,
+            default=d['activation'], help='activation function')
+    parser.add_argument('--eta', type=float, default=d['eta'],
+            help='learning rate')
+    parser.add_argument('--alpha', type=float, default=d['alpha'],
+            help='momentum rate')
+    parser.add_argument('--min-rms', dest='min_rms', type=float,
+            default=d['min_rms'], help='minimum error')
+    parser.add_argument('--min-delta-rms', dest='min_delta_rms', type=float,
+            default=d['min_delta_rms'], help='minimum delta error')
+    parser.add_argument('--minW', type=float, default=d['minW'],
+            help='min initial weight')
+    parser.add_argument('--maxW', type=float, default=d['maxW'],
+            help='max initial weight')
+    parser.add_argument('--momentum', action='store_true',
+            help='use momentum')
+    parser.add_argument('--recurrent', action='store_true',
+            help='recurrent network')
+    parser.add_argument('--engine', choices=settings.ENGINES,
+            default=d['engine'], help='learning engine: the object graph, '
+            'the vectorized one (needs numpy) or the lean one (pure Python)')
+    parser.add_argument('--batch', type=int, default=d['batch'],
+            help='patterns per weight update (1 = online, 0 = all)')
+    parser.add_argument('--trace', type=int, default=d['trace'],
+            choices=[TRACE_OFF, TRACE_STEPS, TRACE_WEIGHTS],
+            help='what to log to the {0} file: {1} nothing, {2} the RMS of '
+            'each step, {3} everything'.format(LOG_SUFFIX, TRACE_OFF,
+                TRACE_STEPS, TRACE_WEIGHTS))
+    parser.add_argument('--history', type=int, default=d['history'],
+            choices=[HISTORY_OFF, HISTORY_RMS, HISTORY_WEIGHTS],
+            help='what to save in the binary {0} file: {1} nothing, {2} the '
+            'RMS of each step, {3} the RMS and all the weights'.format(
+                HISTORY_SUFFIX, HISTORY_OFF, HISTORY_RMS, HISTORY_WEIGHTS))
+    parser.add_argument('--checkpoint', type=int, default=d['checkpoint'],
+            help='save a checkpoint every this many steps (0 = never)')
+    parser.add_argument('--checkpoint-time', dest='checkpoint_time',
+            type=float, default=d['checkpoint_time'],
+            help='save a checkpoint every this many seconds (0 = never)')
+    parser.add_argument('--horizon', type=int, default=d['horizon'],
+            help='number of values forecast after the series, each one fed '
+            'back as an input for the next')
+    parser.add_argument('--outputs', type=int, default=d['outputs'],
+            help='output neurons, learning the values following a window '
+            'directly (all of them forecast at once)')
+    parser.add_argument('--ensemble', type=int, default=d['ensemble'],
+            help='networks learnt at once from different random weights '
+            '(vectorized, needs numpy), forecasting their mean and spread')
+    parser.add_argument('--validation', type=float, default=d['validation'],
+            help='fraction of the windows (the last ones) held out to '
+            'validate the learning, keeping the best weights (0 = none)')
+    parser.add_argument('--validate-every', dest='validate_every', type=int,
+            default=d['validate_every'],
+            help='number of learning steps between validations')
+    parser.add_argument('--patience', type=int, default=d['patience'],
+            help='stop after this many validations without improvement '
+            '(0 = never)')
+    parser.add_argument('--profile', action='store_true',
+            help='time the phases of the learning, printing a summary')
+    parser.add_argument('--cprofile', type=_parse_range, metavar='FIRST:LAST',
+            help='profile the learning steps FIRST to LAST with cProfile, '
+            'dumping the stats to the {0} file'.format(PROFILE_SUFFIX))
+
+def _train(args):
+    """
+    The train command: learns a single series.
+    """
+    config = build_config(args, args.input)
+    if not config:
+        return 1
+    try:
+        r = train(config, _resume_state(args, config))
+    except ValueError as e:
+        _report(True, e)
+        return 1
+    _wait_saved()
+    logging.shutdown()
+    if r['spread']:
+        print 'Ensemble of {0} networks predicts {1} ± {2:.5} (error {3:.2}%)'.format(
+                config['ensemble'], r['predicted'], r['spread'][0], 100*r['err'])
+    else:
+        print 'Network predicts {0} ± {1:.2}%'.format(r['predicted'], 100*r['err'])
+    if len(r['forecast']) > 1:
+        print 'Next values: {0}'.format(' '.join(map(str, r['forecast'])))
+        if r['spread']:
+            print 'Spreads: {0}'.format(' '.join(map(str, r['spread'])))
+    if r['validation'] is not None:
+        print 'Validation error: {0:.5}'.format(r['validation'])
+    if r['profile']:
+        sys.stderr.write(profiling.summary(r['profile']))
+    return 0
+
+def _train_one(job):
+    """
+    Learns one series of the batch command, in a worker process.
+
+    return  (fName, result or None if the configuration is invalid)
+    """
+    (args, fName) = job
+    config = build_config(args, fName)
+    if not config:
+        return (fName, None)
+    try:
+        r = train(config, _resume_state(args, config))
+    except ValueError as e:
+        _report(True, e)
+        return (fName, None)
+    _wait_saved() # the writers don't outlive the worker process
+    logging.shutdown()
+    return (fName, r)
+
+def _batch(args):
+    """
+    The batch command: learns many series with the same configuration, each
+    in its own process.
+    """
+    fNames = find_inputs(args.inputs, args.name)
+    if not fNames:
+        _report(True, "No input found in {0}".format(args.inputs))
+        return 1
+
+    l = max(max(map(len, fNames)), len('input'))
+    print '{0:<{1}}  {2:>12}  {3:>10}'.format('input', l, 'predicted', 'rms')
+
+    failed = 0
+    pool = multiprocessing.Pool(args.jobs or None, settings.init_worker)
+    for (fName, r) in pool.imap(_train_one, [(args, f) for f in fNames]):
+        if r:
+            print '{0:<{1}}  {2:>12.5}  {3:>10.5}'.format(fName, l,
+                    r['predicted'], r['err'])
+        else:
+            print '{0:<{1}}  {2:>12}  {3:>10}'.format(fName, l, '-', '-')
+            failed += 1
+    pool.close()
+    pool.join()
+    return 1 if failed else 0
+
+def _search(args):
+    """
+    The search command: finds the best configurations for a series.
+    """
+    config = build_config(args, args.input)
+    if not config:
+        return 1
+    try:
+        space = search.parse_space(args.vary)
+        if args.samples:
+            candidates = search.sample(space, args.samples)
+        else:
+            candidates = search.grid(space)
+    except ValueError as e:
+        _report(True, e)
+        return 1
+    if args.holdout >= len(config['data']):
+        _report(True, "Cannot hold out the entire series")
+        return 1
+
+    rank = args.rank or ('holdout' if args.holdout else 'rms')
+    if rank == 'holdout' and not args.holdout:
+        _report(True, "Nothing held out to rank on, use --holdout")
+        return 1
+    results = search.search(config, candidates, args.holdout, rank,
+            args.jobs or None)
+
+    keys = sorted(space)
+    print '{0:>4}  {1:>10}  {2:>10}  {3:>12}  {4}'.format('#', 'rms',
+            'holdout', 'predicted', '  '.join(keys))
+    for (i, r) in enumerate(results[:args.top]):
+        c = '  '.join('{0}={1}'.format(k, r['config'][k]) for k in keys)
+        if 'error' in r:
+            print '{0:>4}  {1:>10}  {2:>10}  {3:>12}  {4} ({5})'.format(
+                    i + 1, '-', '-', '-', c, r['error'])
+        else:
+            h = '-' if r['holdout'] is None else '{0:.5}'.format(r['holdout'])
+            print '{0:>4}  {1:>10.5}  {2:>10}  {3:>12.5}  {4}'.format(
+                    i + 1, r['rms'], h, r['predicted'], c)
+    return 0
+
+def _read_values(f):
+    """
+    Reads values from a file as they arrive (any number on each line).
+    """
+    for line in iter(f.readline, ''):
+        for v in line.split():
+            yield float(v)
+
+def _online(args):
+    """
+    The online command: learns a series read as it arrives, printing the
+    forecast of the next value after each one.
+    """
+    try:
+        f = sys.stdin if args.input == '-' else open(args.input)
+    except IOError as e:
+        _report(True, e)
+        return 1
+    values = _read_values(f)
+    try:
+        warmup = [values.next() for i in range(max(args.warmup, args.N + 1))]
+    except StopIteration:
+        _report(True, "Not enough values to start learning")
+        return 1
+    except ValueError as e:
+        _report(True, e)
+        return 1
+    config = _check_config(args, None, warmup)
+    if not config:
+        return 1
+
+    growth = None if args.fixed_range else args.growth
+    f = online.OnlineForecaster(config, args.steps, growth)
+    print '-\t{0}'.format(f.forecast())
+    try:
+        for v in values:
+            print '{0}\t{1}'.format(v, f.update(v))
+            sys.stdout.flush()
+    except ValueError as e:
+        _report(True, e)
+        return 1
+    return 0
+
+def _predict(args):
+    """
+    The predict command: forecasts with a saved network, without learning,
+    the next values (up to the horizon) of many series or of many windows at
+    once.
+    """
+    if args.horizon < 1:
+        _report(True, "Should forecast at least one value")
+        return 1
+    try:
+        m = model.load(args.model)
+    except (IOError, ValueError) as e:
+        _report(True, e)
+        return 1
+
+    if args.windows:
+        try:
+            f = sys.stdin if args.windows == '-' else open(args.windows)
+        except IOError as e:
+            _report(True, e)
+            return 1
+        try:
+            windows = [map(float, l.split()) for l in f if l.strip()]
+            results = m.rollout_windows(windows, args.horizon)
+        except ValueError as e:
+            _report(True, e)
+            return 1
+        for r in results:
+            print '\t'.join(map(str, r))
+        return 0
+
+    fNames = find_inputs(args.inputs, args.name)
+    if not fNames:
+        _report(True, "No input found in {0}".format(args.inputs))
+        return 1
+    series = []
+    for fName in fNames:
+        data = settings.read_data(fName)
+        if data is None:
+            _report(True, "Invalid file {0}!".format(fName))
+            return 1
+        series.append(data)
+    try:
+        results = m.rollout_series(series, args.horizon)
+    except ValueError as e:
+        _report(True, e)
+        return 1
+
+    l = max(max(map(len, fNames)), len('input'))
+    print '{0:<{1}}  {2}'.format('input', l, '  '.join('{0:>12}'.format(
+        'predicted' if h == 0 else '+{0}'.format(h)) for h in range(args.horizon)))
+    for (fName, r) in zip(fNames, results):
+        print '{0:<{1}}  {2}'.format(fName, l,
+                '  '.join('{0:>12.5}'.format(v) for v in r))
+    return 0
+
+def _parse_ints(text):
+    """
+    Parses a comma separated list of integers.
+    """
+    try:
+        return tuple(int(v) for v in text.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError("{0} is not a list of integers".format(
+            text))
+
+def _parse_range(text):
+    """
+    Parses a range of learning steps given as FIRST:LAST.
+    """
+    try:
+        first, last = map(int, text.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("{0} is not FIRST:LAST".format(text))
+    return (first, last)
+
+def _parse_topology(text):
+    """
+    Parses a topology given as N,h1,h2.
+    """
+    t = _parse_ints(text)
+    if len(t) != 3:
+        raise argparse.ArgumentTypeError("{0} is not N,h1,h2".format(text))
+    return t
+
+def _bench(args):
+    """
+    The bench command: measures the learning on the fixtures and on longer
+    synthetic series, writing the results as JSON.
+    """
+    fixed, scaled = bench.cases(args.fixtures, args.topology or (),
+            args.engines.split(','), args.runs, args.batch, args.target,
+            args.lengths, args.sizes, args.scale_runs)
+    if not fixed:
+        _report(True, "No fixture found in {0}".format(args.fixtures))
+        return 1
+
+    def progress(r):
+        sys.stderr.write('{0} {1} {2} {3}: {4} steps/s\n'.format(
+            r['fixture'], r.get('length', '-'), r['topology'], r['engine'],
+            '{0:.4}'.format(r['steps_per_second'])
+            if r['steps_per_second'] else '-'))
+    results = bench.run(fixed, scaled, progress)
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print text
+    return 0
+
+def _check(args):
+    """
+    The check command: learns the first fixture with each engine, in a few
+    configurations, checking that the results are those of the object
+    engine.
+    """
+    found = bench.fixtures(args.fixtures)
+    if not found:
+        _report(True, "No fixture found in {0}".format(args.fixtures))
+        return 1
+
+    results = bench.check(found[0], args.engines.split(','), args.runs,
+            args.tolerance)
+    for (name, e, rms, forecast, ok) in results:
+        print '{0:<12}{1:<8}{2!r:<24}{3} {4}'.format(name, e, rms,
+                ' '.join(repr(v) for v in forecast), 'ok' if ok else 'DIFFERS')
+    return 0 if all(r[-1] for r in results) else 1
+
+def _build_parser():
+    """
+    Builds the parser for the command line.
+    """
+    parser = argparse.ArgumentParser(prog='bp.py',
+            description='Backpropagation for predictions. '
+            'Run without arguments to start the GUI.')
+    sub = parser.add_subparsers(title='commands')
+
+    p = sub.add_parser('train', help='learn a series without the GUI')
+    p.add_argument('--input', required=True, help='file with the series')
+    p.add_argument('--resume', action='store_true',
+            help='continue from the checkpoint of the series, if any')
+    _add_config_arguments(p)
+    p.set_defaults(command=_train)
+
+    p = sub.add_parser('batch',
+            help='learn many series in parallel, with the same options')
+    p.add_argument('--inputs', required=True,
+            help='directory with the series or glob pattern')
+    p.add_argument('--name', default='input.txt',
+            help='name of the series files searched in a directory')
+    p.add_argument('--jobs', type=int, default=0,
+            help='worker processes (0 = one per CPU)')
+    p.add_argument('--resume', action='store_true',
+            help='continue from the checkpoints of the series, if any')
+    _add_config_arguments(p)
+    p.set_defaults(command=_batch)
+
+    p = sub.add_parser('search',
+            help='search the best configuration for a series')
+    p.add_argument('--input', required=True, help='file with the series')
+    p.add_argument('--vary', action='append', required=True,
+            metavar='KEY=V1,V2,...',
+            help='values to try for an option (KEY=LOW:HIGH for a range, '
+            'random search only); can be repeated')
+    p.add_argument('--samples', type=int, default=0,
+            help='number of random candidates (0 = grid search)')
+    p.add_argument('--holdout', type=int, default=0,
+            help='values at the end of the series not learnt, used to rank')
+    p.add_argument('--rank', choices=['rms', 'holdout'],
+            help='rank by the learning error or by the error on the held '
+            'out values (default if there are any)')
+    p.add_argument('--top', type=int, default=10,
+            help='number of candidates shown')
+    p.add_argument('--jobs', type=int, default=0,
+            help='worker processes (0 = one per CPU)')
+    _add_config_arguments(p)
+    p.set_defaults(command=_search)
+
+    p = sub.add_parser('online',
+            help='learn a series as it arrives, forecasting each next value')
+    p.add_argument('--input', default='-',
+            help='file with the series (default: standard input)')
+    p.add_argument('--warmup', type=int, default=0,
+            help='values learnt before starting to forecast (at least N + 1)')
+    p.add_argument('--steps', type=int, default=1,
+            help='learning steps for each new value')
+    p.add_argument('--growth', type=float, default=.1,
+            help='fraction added to the range of the data when a value '
+            'falls outside it')
+    p.add_argument('--fixed-range', action='store_true',
+            help='keep the range of the warm-up values')
+    _add_config_arguments(p)
+    p.set_defaults(command=_online)
+
+    p = sub.add_parser('predict',
+            help='forecast many series with a saved network, without learning')
+    p.add_argument('--model', required=True,
+            help='network saved by a learning (the {0} file)'.format(
+                NETWORK_BINARY_SUFFIX))
+    g = p.add_mutually_exclusive_group(required=True)
+    g.add_argument('--inputs',
+            help='directory with the series or glob pattern')
+    g.add_argument('--windows',
+            help='file with a window of values on each line (- for the '
+            'standard input), forecasting one value for each')
+    p.add_argument('--name', default='input.txt',
+            help='name of the series files searched in a directory')
+    p.add_argument('--horizon', type=int, default=1,
+            help='number of values forecast after each series or window, '
+            'each one fed back as an input for the next')
+    p.set_defaults(command=_predict)
+
+    p = sub.add_parser('bench',
+            help='measure the learning on the fixtures, writing JSON')
+    p.add_argument('--fixtures', default='test',
+            help='directory with the fixtures (each with a series and its '
+            'best_so_far results)')
+    p.add_argument('--topology', type=_parse_topology, action='append',
+            metavar='N,h1,h2',
+            help='topology learnt besides the one of best_so_far; can be '
+            'repeated')
+    p.add_argument('--engines', default=','.join(settings.ENGINES),
+            help='engines measured, comma separated')
+    p.add_argument('--runs', type=int, default=bench.RUNS,
+            help='learning steps for each fixture')
+    p.add_argument('--batch', type=int, default=1,
+            help='patterns per weight update for the vectorized engine')
+    p.add_argument('--target', type=float,
+            help='RMS whose reaching is timed (default: the final RMS of '
+            'best_so_far)')
+    p.add_argument('--lengths', type=_parse_ints,
+            default=bench.SCALE_LENGTHS,
+            help='lengths of the synthetic series, comma separated')
+    p.add_argument('--sizes', type=_parse_ints, default=bench.SCALE_SIZES,
+            help='sizes (N and h1, h2 being half) of the networks learning '
+            'the synthetic series, comma separated')
+    p.add_argument('--scale-runs', dest='scale_runs', type=int,
+            default=bench.SCALE_RUNS,
+            help='learning steps for each synthetic series')
+    p.add_argument('--output', help='file for the results (default: '
+            'standard output)')
+    p.set_defaults(command=_bench)
+
+    p = sub.add_parser('check',
+            help='check that the engines learn the same as the object one')
+    p.add_argument('--fixtures', default='test',
+            help='directory with the fixtures, the first one being learnt')
+    p.add_argument('--engines', default=','.join(settings.ENGINES),
+            help='engines checked, comma separated')
+    p.add_argument('--runs', type=int, default=bench.CHECK_RUNS,
+            help='learning steps for each configuration')
+    p.add_argument('--tolerance', type=float, default=bench.CHECK_TOLERANCE,
+            help='relative tolerance for the vectorized engine')
+    p.set_defaults(command=_check)
+
+    return parser
+
+def main(argv):
+    """
+    Parses the command line and runs the requested command.
+
+    return  exit code
+    """
+    args = _build_parser().parse_args(argv)
+    return args.command(args)
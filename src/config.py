@@ -5,6 +5,9 @@
 
 import gtk
 
+import activations
+import settings
+
 class Config(object):
     """
     Configuration dialog.
@@ -61,12 +64,13 @@ class Config(object):
         Builds the GUI allowing to select between activation functions.
         """
         _aVBox = self._build_compund_gui_box(_checkHBox, "Activations:")
-        self._log = gtk.RadioButton(None, 'Simple logistic')
-        self._2log = gtk.RadioButton(self._log, 'Logistic in [-1, 1]')
-        self._tanh = gtk.RadioButton(self._log, 'Tanh')
-        _aVBox.add(self._log)
-        _aVBox.add(self._2log)
-        _aVBox.add(self._tanh)
+        self._activations = []
+        group = None
+        for name in activations.NAMES:
+            b = gtk.RadioButton(group, activations.get(name).title)
+            group = group or b
+            self._activations.append((name, b))
+            _aVBox.add(b)
 
     def _build_params_gui(self, _checkHBox):
         """
@@ -78,6 +82,7 @@ class Config(object):
         self._minRmsCounter = self._build_counter('minimum error:', 0, .1, _aVBox, .01)
         self._minRmsCounter.get_adjustment().set_value(.01)
         self._minDeltaRmsCounter = self._build_counter('minimum delta error:', 0, .1, _aVBox, .01)
+        self._batch = self._build_labeled_input('batch size (0 = all):', _aVBox, '1')
 
     def _build_extra_gui(self, _checkHBox):
         """
@@ -91,8 +96,29 @@ class Config(object):
         self._momentum = gtk.CheckButton('Use momentum')
         self._momentum.connect('clicked', self.__on_momentum)
         self._recurrent = gtk.CheckButton('Recurent network')
+        self._engines = []
+        group = None
+        for (name, title) in zip(settings.ENGINES,
+                ['Object engine', 'Vectorized engine', 'Lean engine']):
+            b = gtk.RadioButton(group, title)
+            group = group or b
+            self._engines.append((name, b))
+        self._profile = gtk.CheckButton('Profile phases')
+        self._traceCounter = self._build_counter('trace level:', 0, 2, _aVBox, 1, 0)
+        self._historyCounter = self._build_counter('history level:', 0, 2, _aVBox, 1, 0)
+        self._tickCounter = self._build_counter('ms per tick (0 = thread):', 0, 1000, _aVBox, 10, 0)
+        self._checkpointCounter = self._build_counter('checkpoint every (steps):', 0, 10000, _aVBox, 100, 0)
+        self._horizonCounter = self._build_counter('forecast horizon (steps):', 1, 1000, _aVBox, 1, 0)
+        self._outputsCounter = self._build_counter('output neurons:', 1, 100, _aVBox, 1, 0)
+        self._ensembleCounter = self._build_counter('ensemble (networks):', 1, 100, _aVBox, 1, 0)
+        self._validationCounter = self._build_counter('validation fraction:', 0, .5, _aVBox)
+        self._patienceCounter = self._build_counter('patience (validations):', 0, 100, _aVBox, 1, 0)
+        self._patienceCounter.get_adjustment().set_value(settings.DEFAULTS['patience'])
         _aVBox.add(self._momentum)
         _aVBox.add(self._recurrent)
+        for (name, b) in self._engines:
+            _aVBox.add(b)
+        _aVBox.add(self._profile)
 
     def _build_IO_gui(self, _topVBox):
         """
@@ -219,16 +245,8 @@ class Config(object):
             return False
 
         self._configDict['baseName'] = fName
-
-        try:
-            with open(fName) as f:
-                d = f.readline()
-                p = d.split()
-                self._configDict['data'] = map(float, p)
-                self._configDict['N'] = len(self._configDict['data'])
-        except Exception as e:
-            return False
-        return True
+        self._configDict['data'] = settings.read_data(fName)
+        return self._configDict['data'] is not None
 
     def _complete_config(self):
         """
@@ -242,37 +260,45 @@ class Config(object):
             return False
         if not self._read_int_text_widget('h2', self._h2):
             return False
+        if not self._read_int_text_widget('batch', self._batch):
+            return False
 
-        if self._log.get_active():
-            self._configDict['activation'] = 'log'
-        elif self._2log.get_active():
-            self._configDict['activation'] = '2log'
-        else:
-            self._configDict['activation'] = 'tanh'
+        for (name, b) in self._activations:
+            if b.get_active():
+                self._configDict['activation'] = name
 
         self._configDict['minW'] = self._minCounter.get_value()
         self._configDict['maxW'] = self._maxCounter.get_value()
         self._configDict['momentum'] = self._momentum.get_active()
         self._configDict['recurrent'] = self._recurrent.get_active()
+        for (name, b) in self._engines:
+            if b.get_active():
+                self._configDict['engine'] = name
+        self._configDict['trace'] = int(self._traceCounter.get_value())
+        self._configDict['history'] = int(self._historyCounter.get_value())
+        self._configDict['tick'] = int(self._tickCounter.get_value())
+        self._configDict['checkpoint'] = int(self._checkpointCounter.get_value())
+        self._configDict['checkpoint_time'] = settings.DEFAULTS['checkpoint_time']
+        self._configDict['horizon'] = int(self._horizonCounter.get_value())
+        self._configDict['outputs'] = int(self._outputsCounter.get_value())
+        self._configDict['ensemble'] = int(self._ensembleCounter.get_value())
+        self._configDict['validation'] = self._validationCounter.get_value()
+        self._configDict['validate_every'] = settings.DEFAULTS['validate_every']
+        self._configDict['patience'] = int(self._patienceCounter.get_value())
+        self._configDict['profile'] = self._profile.get_active()
+        self._configDict['cprofile'] = settings.DEFAULTS['cprofile']
 
         self._configDict['alpha'] = self._alphaCounter.get_value()
         self._configDict['eta'] = self._etaCounter.get_value()
         self._configDict['min_rms'] = self._minRmsCounter.get_value()
         self._configDict['min_delta_rms'] = self._minDeltaRmsCounter.get_value()
 
-        if self._configDict['minW'] > self._configDict['maxW'] - .1:
-            self._report(gtk.MESSAGE_WARNING, "Invalid interval for weights, ignored")
-            self._configDict['minW'] = -1
-            self._configDict['maxW'] = 1
-
-        if self._configDict['h1'] == 0 and self._configDict['h2'] != 0:
-            self._report(gtk.MESSAGE_WARNING, "Still a network with a single layer")
-
-        if self._configDict['N'] < 1:
-            self._report(gtk.MESSAGE_ERROR, "Order should be at least 1")
-            return False
-
-        return True
+        ok = True
+        for (fatal, text) in settings.check_config(self._configDict):
+            self._report(gtk.MESSAGE_ERROR if fatal else gtk.MESSAGE_WARNING,
+                    text)
+            ok = ok and not fatal
+        return ok
 
     def _read_int_text_widget(self, cfgName, widget):
         """
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Learning sets built from a series, without copying the series.
+"""
+
+try:
+    import numpy
+    from numpy.lib.stride_tricks import as_strided
+except ImportError:
+    numpy = None # only the iteration over the windows is available
+
+class Windows(object):
+    """
+    The learning set of a (normalized) series: each pattern is a window of N
+    consecutive values and the expected output is the value following the
+    window (or, for a network with H outputs, the H values following it, as
+    a tuple). The question (the pattern for the value to be predicted) is the
+    window of the last N values.
+
+    Only the series is stored. Iterating gives the (window, expected) pairs
+    one at a time; with numpy, all the patterns are also available as a
+    read-only matrix which is a view over the series.
+    """
+
+    def __init__(self, series, N, H=1):
+        """
+        series  the values (a list or a one dimensional array)
+        N       number of values in a window
+        H       number of values expected after a window
+        """
+        self._series = series
+        self._N = N
+        self._H = H
+        self._array = None
+
+    def __len__(self):
+        return max(len(self._series) - self._N - self._H + 1, 0)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return (self._series[i:i+self._N], self._expected(i + self._N))
+
+    def __iter__(self):
+        s, N = self._series, self._N
+        for i in xrange(len(self)):
+            yield (s[i:i+N], self._expected(i + N))
+
+    def _expected(self, i):
+        """
+        Returns the expected output starting at position i of the series.
+        """
+        if self._H == 1:
+            return self._series[i]
+        return tuple(self._series[i:i+self._H])
+
+    def series(self):
+        return self._series
+
+    def question(self):
+        return self._series[-self._N:]
+
+    def patterns(self):
+        """
+        Returns all the patterns as a read-only matrix, one pattern per row.
+        No value is copied: the rows overlap in the same memory. Needs numpy.
+        """
+        a = self._as_array()
+        s = a.strides[0]
+        return as_strided(a, (len(self), self._N), (s, s), writeable=False)
+
+    def expected(self):
+        """
+        Returns the expected outputs as a read-only vector (a matrix with a
+        row for each pattern if H values are expected), a view over the
+        series. Needs numpy.
+        """
+        a = self._as_array()[self._N:]
+        if self._H == 1:
+            return a
+        s = a.strides[0]
+        return as_strided(a, (len(self), self._H), (s, s), writeable=False)
+
+    def _as_array(self):
+        """
+        The series as a read-only array. It is converted only once, and only
+        if it's not already an array.
+        """
+        if self._array is None:
+            self._array = numpy.asarray(self._series, dtype=float)
+            if self._array is not self._series:
+                self._array.flags.writeable = False
+        return self._array
@@ -0,0 +1,679 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Vectorized learning engine.
+
+Each layer of the network (hidden1, hidden2, output) is kept as a weight
+matrix with one row per neuron and one column per input unit, the bias being
+the last column (just like the Fixed unit is the last unit of each layer in
+the object graph). The forward and backward passes are matrix-vector
+operations but follow exactly the same rules as units.Neuron: momentum,
+clipping of the weights to [-1, 1] and self-recurrent weights.
+
+The output layer can have several neurons (one for each value forecast at
+once); with a single one, outputs and errors are numbers, otherwise vectors.
+
+An Ensemble learns several networks at once, each matrix getting a leading
+dimension for the member networks.
+"""
+
+import itertools
+import random
+
+import numpy
+
+# patterns presented at once inside a block, bounding the memory used
+CHUNK = 4096
+
+class Engine(object):
+    """
+    Vectorized equivalent of the Neuron object graph.
+
+    The engine is built from the already constructed neurons (thus it starts
+    from the very same random weights, or from the state restored in them)
+    and can write its state back into them when they have to be drawn or
+    saved.
+    """
+
+    def __init__(self, layers, activation, momentum, eta, alpha):
+        """
+        Builds the engine.
+
+        layers      list of layers, each a list of Neuron (no Fixed units)
+        activation  activations.Activation
+        momentum    True if momentum is used
+        eta         learning rate
+        alpha       momentum rate
+        """
+        self._act = activation
+        self._momentum = momentum
+        self._ETA = eta
+        self._ETA_ALPHA = eta * alpha
+        self._recurrent = layers[0][0].recurrent_weight() is not None
+
+        self._W = []
+        self._selfw = []
+        for l in layers:
+            self._W.append(numpy.array([n.weights() for n in l], dtype=float))
+            if self._recurrent:
+                self._selfw.append(numpy.array(
+                    [n.recurrent_weight() for n in l], dtype=float))
+
+        # x[k] is the input of layer k, ending with the bias unit; the
+        # outputs of layer k are a view in x[k + 1]
+        self._x = [numpy.zeros(w.shape[1]) for w in self._W]
+        self._x.append(numpy.zeros(self._W[-1].shape[0] + 1))
+        for x in self._x:
+            x[-1] = 1
+        self._v = [x[:-1] for x in self._x[1:]]
+        # learning factors of the outputs, for the last learnt pattern
+        self._d = [numpy.zeros(w.shape[0]) for w in self._W]
+
+        # errors from recurrent connections, reported for the next pattern
+        self._carry = [numpy.zeros(w.shape[0]) for w in self._W]
+
+        if self._momentum:
+            self._ow = [numpy.zeros(w.shape) for w in self._W]
+            self._sow = [numpy.zeros(w.shape[0]) for w in self._W]
+
+        # outputs, errors and deltas left in the neurons
+        for (k, l) in enumerate(layers):
+            for (j, n) in enumerate(l):
+                self._v[k][j], self._carry[k][j] = n.state()
+                if self._momentum:
+                    ow, sow = n.momentum_weights()
+                    self._ow[k][j] = ow
+                    if self._recurrent:
+                        self._sow[k][j] = sow
+
+        self._X = None
+        self._y = None
+
+    def load_data(self, data):
+        """
+        Uses a learning set, as a matrix of patterns and a vector (or matrix)
+        of expected outputs (both views over the series, nothing is copied).
+
+        data    dataset.Windows
+        """
+        self._X = data.patterns()
+        self._y = data.expected()
+
+    def present(self, pattern):
+        """
+        Presents a pattern to the network, returning the output (a vector if
+        there are more outputs).
+        """
+        return self._forward(pattern, False)
+
+    def learn_pattern(self, pattern, desired):
+        """
+        Presents a pattern and learns from its error. Returns the error.
+        """
+        e = self._forward(pattern, True) - desired
+        self._backpropagate(e)
+        return e
+
+    def learn_epoch(self, batch=1):
+        """
+        Does one learning step over the entire learning set, returning the
+        sum of the squared errors of each output, as a list.
+
+        batch   number of patterns for which the gradients are accumulated
+                before updating the weights: 1 is online learning (one update
+                per pattern, exactly like units.Neuron), 0 means the entire
+                learning set (full batch)
+        """
+        if batch == 1:
+            sse = 0
+            # izip: a window (a view) at a time, not a list of all of them
+            for (inp, out) in itertools.izip(self._X, self._y):
+                e = self.learn_pattern(inp, out)
+                sse += e * e
+            return numpy.atleast_1d(sse).tolist()
+
+        P = len(self._y)
+        if batch <= 0 or batch > P:
+            batch = P
+        sse = numpy.zeros(len(self._W[-1]))
+        for i in range(0, P, batch):
+            e = self.learn_block(self._X[i:i+batch], self._y[i:i+batch])
+            sse += [numpy.dot(c, c) for c in e.T]
+        return sse.tolist()
+
+    def learn_block(self, patterns, desired):
+        """
+        Presents a block of patterns, accumulates the gradients for all of
+        them and does a single update of the weights, using the mean gradient.
+        Returns the errors, a row for each pattern and a column for each
+        output.
+
+        Large blocks are presented CHUNK patterns at a time (with the same
+        weights), so the patterns are never copied all at once.
+        """
+        B = len(desired)
+        desired = numpy.reshape(desired, (B, -1))
+        deltas = [(numpy.zeros(W.shape), numpy.zeros(W.shape[0]))
+                for W in self._W]
+        e = numpy.empty(desired.shape)
+        for i in range(0, B, CHUNK):
+            xs, vs, ds = self._present_block(patterns[i:i+CHUNK])
+            e[i:i+CHUNK] = vs[-1] - desired[i:i+CHUNK]
+            self._backpropagate_block(xs, vs, ds, e[i:i+CHUNK], deltas)
+        self._update_block(deltas, B)
+        return e
+
+    def evaluate(self, data):
+        """
+        Returns the sum of the squared errors of each output over a learning
+        set, as a list, without learning from it: all the patterns go through
+        each layer at once (CHUNK at a time). The outputs kept for a recurrent
+        network are restored afterwards.
+
+        data    dataset.Windows
+        """
+        X, y = data.patterns(), data.expected()
+        P = len(y)
+        y = numpy.reshape(y, (P, -1))
+        saved = [v.copy() for v in self._v]
+        sse = numpy.zeros(y.shape[1])
+        for i in range(0, P, CHUNK):
+            xs, vs, ds = self._present_block(X[i:i+CHUNK], False)
+            e = vs[-1] - y[i:i+CHUNK]
+            sse += (e * e).sum(axis=0)
+        for (v, s) in zip(self._v, saved):
+            v[:] = s
+        return sse.tolist()
+
+    def set_weights(self, layers):
+        """
+        Replaces the weights, given like layer_weights returns them.
+        """
+        for (k, (W, S)) in enumerate(layers):
+            self._W[k][...] = W
+            if self._recurrent:
+                self._selfw[k][...] = S
+
+    def layer_weights(self):
+        """
+        Returns (weights, recurrent weights) for each layer, the recurrent
+        weights being None if the network is not recurrent. The arrays are
+        not copied.
+        """
+        return [(self._W[k], self._selfw[k] if self._recurrent else None)
+                for k in range(len(self._W))]
+
+    def layer_momentum(self):
+        """
+        Returns the last deltas of the weights, used for the momentum, in the
+        same form as layer_weights; None if momentum is not used.
+        """
+        if not self._momentum:
+            return None
+        return [(self._ow[k], self._sow[k] if self._recurrent else None)
+                for k in range(len(self._W))]
+
+    def rescale_inputs(self, a, b):
+        """
+        Changes the first layer such that the network computes the same
+        outputs when each input x is replaced by a * x + b. Exact only if the
+        new weights are not clipped to [-1, 1].
+        """
+        ws = [self._W[0]]
+        if self._momentum:
+            ws.append(self._ow[0])
+        for W in ws:
+            W[:, -1] -= b / a * W[:, :-1].sum(axis=1)
+            W[:, :-1] /= a
+        numpy.clip(self._W[0], -1, 1, out=self._W[0])
+
+    def store(self, layers, state=False):
+        """
+        Writes the weights back into the neurons of the object graph.
+
+        state   if True, everything else needed to continue the learning
+                with the neurons is also written: outputs, errors and deltas
+        """
+        for k in range(len(self._W)):
+            for j in range(len(layers[k])):
+                n = layers[k][j]
+                sw = self._selfw[k][j] if self._recurrent else None
+                n.set_weights(self._W[k][j].tolist(), sw)
+                if not state:
+                    continue
+                n.set_state(float(self._v[k][j]), float(self._carry[k][j]))
+                if self._momentum:
+                    sow = float(self._sow[k][j]) if self._recurrent else None
+                    n.set_momentum_weights(self._ow[k][j].tolist(), sow)
+
+    def _forward(self, pattern, learn):
+        """
+        Presents a pattern to the network, returning the output (a copy of
+        the output vector if there are more outputs). If learn is True the
+        learning factors are also computed, for the backpropagation.
+        """
+        self._x[0][:-1] = pattern
+        for k in range(len(self._W)):
+            s = numpy.dot(self._W[k], self._x[k])
+            if self._recurrent:
+                s += self._selfw[k] * self._v[k]
+            if learn:
+                self._v[k][:], self._d[k][:] = self._act.outputs_and_factors(s)
+            else:
+                self._v[k][:] = self._act.outputs(s)
+        if len(self._v[-1]) == 1:
+            return self._v[-1][0]
+        return self._v[-1].copy()
+
+    def _present_block(self, patterns, learn=True):
+        """
+        Presents a block of patterns, one per row. Returns the inputs
+        (without the bias column, so that the patterns are not copied), the
+        outputs and the learning factors of each layer (None if learn is
+        False).
+        """
+        B = len(patterns)
+        x = patterns
+        xs, vs, ds = [], [], []
+        for k in range(len(self._W)):
+            W = self._W[k]
+            s = numpy.dot(x, W[:, :-1].T)
+            s += W[:, -1]
+            if self._recurrent:
+                # each pattern depends on the output for the previous one
+                v, sw = self._v[k], self._selfw[k]
+                for t in range(B):
+                    s[t] += sw * v
+                    v = s[t] = self._act.outputs(s[t])
+                self._v[k][:] = v
+                d = self._act.factors(s) if learn else None
+            elif learn:
+                s, d = self._act.outputs_and_factors(s)
+                self._v[k][:] = s[-1]
+            else:
+                s, d = self._act.outputs(s), None
+                self._v[k][:] = s[-1]
+            xs.append(x)
+            vs.append(s)
+            ds.append(d)
+            x = s
+        return xs, vs, ds
+
+    def _backpropagate_block(self, xs, vs, ds, e, deltas):
+        """
+        Backpropagation for (a part of) a block of patterns. All errors are
+        computed with the weights from the start of the block; the deltas of
+        the weights are only summed in deltas, a list of (weights deltas,
+        recurrent weights deltas) for each layer.
+        """
+        B = len(e)
+        err = e.copy()
+        for k in reversed(range(len(self._W))):
+            W, v, x = self._W[k], vs[k], xs[k]
+            dW, dsw = deltas[k]
+
+            if self._recurrent:
+                # the error from the recurrent connection goes to the next
+                # pattern of the block
+                c, sw = self._carry[k], self._selfw[k]
+                for t in range(B):
+                    err[t] += c
+                    c = sw * err[t]
+                self._carry[k] = c
+
+            if k:
+                prev = numpy.dot(err, W[:, :-1])
+
+            g = self._ETA * err * ds[k]
+            dW[:, :-1] += numpy.dot(g.T, x)
+            dW[:, -1] += g.sum(axis=0)
+            if self._recurrent:
+                dsw += (g * v).sum(axis=0)
+
+            if k:
+                err = prev
+
+    def _update_block(self, deltas, B):
+        """
+        Updates the weights with the mean of the deltas summed over a block
+        of B patterns.
+        """
+        for k in range(len(self._W)):
+            W, (delta, ds) = self._W[k], deltas[k]
+            delta /= B
+            if self._momentum:
+                delta += self._ETA_ALPHA * self._ow[k]
+                self._ow[k] = delta
+            W -= delta
+            numpy.clip(W, -1, 1, out=W)
+
+            if self._recurrent:
+                sw = self._selfw[k]
+                ds /= B
+                if self._momentum:
+                    ds += self._ETA_ALPHA * self._sow[k]
+                    self._sow[k] = ds
+                sw -= ds
+                numpy.clip(sw, -1, 1, out=sw)
+
+    def _backpropagate(self, e):
+        """
+        Does the backpropagation, from the output layer to the first hidden
+        one.
+        """
+        err = self._carry[-1] + e
+        for k in reversed(range(len(self._W))):
+            W, v, x = self._W[k], self._v[k], self._x[k]
+
+            # error for the previous layer, computed with the old weights
+            if k:
+                prev = numpy.dot(err, W[:, :-1])
+
+            g = self._ETA * err * self._d[k]
+            delta = numpy.outer(g, x)
+            if self._momentum:
+                delta += self._ETA_ALPHA * self._ow[k]
+                self._ow[k] = delta
+            W -= delta
+            numpy.clip(W, -1, 1, out=W)
+
+            if self._recurrent:
+                sw = self._selfw[k]
+                delta = g * v
+                if self._momentum:
+                    delta += self._ETA_ALPHA * self._sow[k]
+                    self._sow[k] = delta
+                self._carry[k] = sw * err
+                sw -= delta
+                numpy.clip(sw, -1, 1, out=sw)
+
+            if k:
+                err = prev + self._carry[k - 1]
+
+def _uniform(shape, minW, maxW):
+    """
+    Returns an array of random weights, drawn like units.Neuron does.
+    """
+    return numpy.reshape([random.uniform(minW, maxW)
+        for i in range(int(numpy.prod(shape)))], shape)
+
+class Ensemble(object):
+    """
+    Several networks with the same topology, learnt at once from different
+    random weights. Each array of Engine gets a leading dimension, one row
+    for each member, so a pattern goes through all the members (and all
+    their weights are updated) with the same operations as through a single
+    network. The members learn online (one update per pattern), following
+    the same rules as units.Neuron.
+
+    The ensemble outputs the mean of the outputs of its members, the spread
+    of their forecasts (see rollout) estimating how uncertain these are.
+    Only the first member, which starts from the weights of the neurons, is
+    written back into them (to be drawn and saved).
+    """
+
+    def __init__(self, layers, members, minW, maxW, activation, momentum,
+            eta, alpha, state=None):
+        """
+        Builds the ensemble.
+
+        layers      list of layers, each a list of Neuron (no Fixed units),
+                    holding the first member
+        members     number of networks
+        minW        minimum random weight of the other members
+        maxW        maximum random weight of the other members
+        activation  activations.Activation
+        momentum    True if momentum is used
+        eta         learning rate
+        alpha       momentum rate
+        state       state of the ensemble (see state) to resume from, None
+                    to start the other members from random weights
+        """
+        first = Engine(layers, activation, momentum, eta, alpha)
+        K = members
+        self._act = activation
+        self._momentum = momentum
+        self._ETA = eta
+        self._ETA_ALPHA = eta * alpha
+        self._recurrent = first._recurrent
+
+        self._W = []
+        self._selfw = []
+        for (W, S) in first.layer_weights():
+            self._W.append(numpy.array([W] +
+                [_uniform(W.shape, minW, maxW) for m in range(1, K)]))
+            if self._recurrent:
+                self._selfw.append(numpy.array([S] +
+                    [_uniform(S.shape, minW, maxW) for m in range(1, K)]))
+
+        # same layout as in Engine, a row for each member
+        self._x = [numpy.zeros((K, W.shape[2])) for W in self._W]
+        self._x.append(numpy.zeros((K, self._W[-1].shape[1] + 1)))
+        for x in self._x:
+            x[:, -1] = 1
+        self._v = [x[:, :-1] for x in self._x[1:]]
+        self._d = [numpy.zeros(W.shape[:2]) for W in self._W]
+        self._carry = [numpy.zeros(W.shape[:2]) for W in self._W]
+        if self._momentum:
+            self._ow = [numpy.zeros(W.shape) for W in self._W]
+            self._sow = [numpy.zeros(W.shape[:2]) for W in self._W]
+
+        # all members go on from the outputs and errors left in the neurons,
+        # only the first one from their deltas
+        for k in range(len(self._W)):
+            self._v[k][...] = first._v[k]
+            self._carry[k][...] = first._carry[k]
+            if self._momentum:
+                self._ow[k][0] = first._ow[k]
+                self._sow[k][0] = first._sow[k]
+
+        if state:
+            self._restore(state)
+
+        self._X = None
+        self._y = None
+
+    def load_data(self, data):
+        """
+        Uses a learning set, like Engine.load_data.
+        """
+        self._X = data.patterns()
+        self._y = data.expected()
+
+    def present(self, pattern):
+        """
+        Presents a pattern to all the members, returning the mean output (a
+        vector if there are more outputs).
+        """
+        y = self._forward(pattern, False).mean(axis=0)
+        return y[0] if len(y) == 1 else y
+
+    def learn_pattern(self, pattern, desired):
+        """
+        Presents a pattern to all the members and each one learns from its
+        error. Returns the error of the mean output.
+        """
+        e = self._forward(pattern, True) - desired
+        self._backpropagate(e)
+        e = e.mean(axis=0)
+        return e[0] if len(e) == 1 else e
+
+    def learn_epoch(self, batch=1):
+        """
+        Does one learning step over the entire learning set, returning the
+        sum of the squared errors of the mean output, for each output, as a
+        list. The members always learn online, batch is ignored.
+        """
+        sse = numpy.zeros(self._W[-1].shape[1])
+        for (inp, out) in itertools.izip(self._X, self._y):
+            e = self.learn_pattern(inp, out)
+            sse += e * e
+        return sse.tolist()
+
+    def evaluate(self, data):
+        """
+        Returns the sum of the squared errors of the mean output over a
+        learning set, like Engine.evaluate.
+        """
+        X, y = data.patterns(), data.expected()
+        y = numpy.reshape(y, (len(y), -1))
+        saved = [v.copy() for v in self._v]
+        sse = numpy.zeros(y.shape[1])
+        for (inp, out) in itertools.izip(X, y):
+            e = self._forward(inp, False).mean(axis=0) - out
+            sse += e * e
+        for (v, s) in zip(self._v, saved):
+            v[...] = s
+        return sse.tolist()
+
+    def rollout(self, pattern, H):
+        """
+        Forecasts H values after a pattern with each member, each one feeding
+        its own outputs back as the last inputs of its next pattern. Returns
+        a matrix with the forecasts of each member on a row.
+        """
+        K = len(self._W[0])
+        x = numpy.tile(numpy.asarray(pattern, dtype=float), (K, 1))
+        ys = []
+        while len(ys) < H:
+            y = self._forward(x, False)
+            ys.extend(y.T.copy())
+            x = numpy.hstack((x, y))[:, -len(pattern):]
+        return numpy.array(ys[:H]).T
+
+    def members(self):
+        """
+        Returns (weights, recurrent weights) for each layer, with a leading
+        dimension for the members (the recurrent weights being None if the
+        network is not recurrent). The arrays are not copied.
+        """
+        return [(self._W[k], self._selfw[k] if self._recurrent else None)
+                for k in range(len(self._W))]
+
+    def set_weights(self, layers):
+        """
+        Replaces the weights of all the members, given like members returns
+        them.
+        """
+        for (k, (W, S)) in enumerate(layers):
+            self._W[k][...] = W
+            if self._recurrent:
+                self._selfw[k][...] = S
+
+    def layer_weights(self):
+        """
+        Returns the weights of the first member, like Engine.layer_weights.
+        """
+        return [(W[0], S[0] if S is not None else None)
+                for (W, S) in self.members()]
+
+    def layer_momentum(self):
+        """
+        Returns the last deltas of the weights of the first member, like
+        Engine.layer_momentum.
+        """
+        if not self._momentum:
+            return None
+        return [(self._ow[k][0], self._sow[k][0] if self._recurrent else None)
+                for k in range(len(self._W))]
+
+    def store(self, layers, state=False):
+        """
+        Writes the first member back into the neurons, like Engine.store.
+        """
+        for k in range(len(self._W)):
+            for j in range(len(layers[k])):
+                n = layers[k][j]
+                sw = self._selfw[k][0, j] if self._recurrent else None
+                n.set_weights(self._W[k][0, j].tolist(), sw)
+                if not state:
+                    continue
+                n.set_state(float(self._v[k][0, j]), float(self._carry[k][0, j]))
+                if self._momentum:
+                    sow = float(self._sow[k][0, j]) if self._recurrent else None
+                    n.set_momentum_weights(self._ow[k][0, j].tolist(), sow)
+
+    def state(self):
+        """
+        Returns a copy of everything needed to continue the learning of all
+        the members, as Python lists.
+        """
+        lists = lambda arrays: [a.tolist() for a in arrays]
+        return {'weights': lists(self._W),
+                'recurrent': lists(self._selfw),
+                'momentum': lists(self._ow) if self._momentum else None,
+                'recurrent_momentum': lists(self._sow) if self._momentum else None,
+                'outputs': lists(self._v),
+                'errors': lists(self._carry)}
+
+    def _restore(self, state):
+        """
+        Restores a state returned by state.
+        """
+        if [list(W.shape) for W in self._W] != \
+                [list(numpy.shape(W)) for W in state['weights']]:
+            raise ValueError("The state is for another ensemble")
+        for k in range(len(self._W)):
+            self._W[k][...] = state['weights'][k]
+            if self._recurrent:
+                self._selfw[k][...] = state['recurrent'][k]
+            if self._momentum:
+                self._ow[k] = numpy.array(state['momentum'][k])
+                self._sow[k] = numpy.array(state['recurrent_momentum'][k])
+            self._v[k][...] = state['outputs'][k]
+            self._carry[k] = numpy.array(state['errors'][k])
+
+    def _forward(self, patterns, learn):
+        """
+        Presents a pattern to all the members (or a pattern to each one, one
+        per row), returning their outputs, a row for each member (a view,
+        changed by the next presentation). If learn is True the learning
+        factors are also computed, for the backpropagation.
+        """
+        self._x[0][:, :-1] = patterns
+        for k in range(len(self._W)):
+            s = numpy.einsum('koi,ki->ko', self._W[k], self._x[k])
+            if self._recurrent:
+                s += self._selfw[k] * self._v[k]
+            if learn:
+                self._v[k][...], self._d[k][...] = self._act.outputs_and_factors(s)
+            else:
+                self._v[k][...] = self._act.outputs(s)
+        return self._v[-1]
+
+    def _backpropagate(self, e):
+        """
+        Does the backpropagation for all the members, e having the errors of
+        each member on a row.
+        """
+        err = self._carry[-1] + e
+        for k in reversed(range(len(self._W))):
+            W, v, x = self._W[k], self._v[k], self._x[k]
+
+            # error for the previous layer, computed with the old weights
+            if k:
+                prev = numpy.einsum('ko,koi->ki', err, W[:, :, :-1])
+
+            g = self._ETA * err * self._d[k]
+            delta = g[:, :, None] * x[:, None, :]
+            if self._momentum:
+                delta += self._ETA_ALPHA * self._ow[k]
+                self._ow[k] = delta
+            W -= delta
+            numpy.clip(W, -1, 1, out=W)
+
+            if self._recurrent:
+                sw = self._selfw[k]
+                delta = g * v
+                if self._momentum:
+                    delta += self._ETA_ALPHA * self._sow[k]
+                    self._sow[k] = delta
+                self._carry[k] = sw * err
+                sw -= delta
+                numpy.clip(sw, -1, 1, out=sw)
+
+            if k:
+                err = prev + self._carry[k - 1]
@@ -14,12 +14,27 @@ ICON_FILE = IMG_FOLDER + "nn.png"
 
 NETWORK_SUFFIX = '.nw.png'
 NETWORK_MATRIX_SUFFIX = '.nw.weights'
+NETWORK_BINARY_SUFFIX = '.nw.bin'
 RMS_FILE_SUFFIX = '.err'
 RMS_PLOT_SUFFIX = '.err.png'
+VALIDATION_FILE_SUFFIX = '.verr'
 VAL_SUFFIX = '.val'
 VAL_PLOT_SUFFIX = '.val.png'
 LOG_SUFFIX = '.log'
+PROFILE_SUFFIX = '.prof'
+HISTORY_SUFFIX = '.hist'
+CHECKPOINT_SUFFIX = '.ckpt'
 
 LOGNAME = 'MAIN.log'
 LOGFNAME = LOGNAME
 
+# trace levels: what is logged while learning
+TRACE_OFF = 0
+TRACE_STEPS = 1 # RMS of each step
+TRACE_WEIGHTS = 2 # every pattern, activation, error and weight change
+
+# binary history levels: what is saved for each learning step
+HISTORY_OFF = 0
+HISTORY_RMS = 1
+HISTORY_WEIGHTS = 2 # the RMS and all the weights
+
@@ -6,89 +6,94 @@
 import normalizer
 
 import gtk
+import pango
 
 from globaldefs import *
+from units import Fixed, Neuron, Output, Pattern
 
 SIZE = 40
 PAD = 80
 RPAD = 5
+LEVELS = 32 # shades of red (and of green) used for the edges
 
 class Grapher(object):
     """
     Will produce a nice graph of the neural network using Dot.
+
+    The units never move, so they are drawn only once, in a background
+    pixmap; their positions are kept here, not in the units. Each edge is
+    coloured according to its weight, using one of a few shades, and is
+    redrawn only when its shade changes.
     """
     def __init__(self, img, w):
         self._img = img
         self._w = w
         self._pixmap = None
+        self._background = None
+        self._pos = {}
 
     def drawable(self):
         return self._pixmap
 
-    def graph(self):
+    def graph(self, layers=None):
         """
         Called when network graph needs to be updated.
-        """
-        self._do_cleanup_draw()
 
-        gc = self._w.get_style().black_gc
-        pcon = self._w.get_pango_context()
-        for n in self._units:
-            n.draw(self._pixmap, gc, SIZE, pcon)
+        layers  weights to draw, as (weights, recurrent weights) for each
+                layer of neurons (see Network.layer_weights); the current
+                weights of the neurons are drawn if None
+        """
+        if not self._background:
+            self._draw_background()
 
-        ngc = self._w.get_window().new_gc()
-        ngc.copy(gc)
-        ngc.set_line_attributes(2, gtk.gdk.LINE_SOLID, gtk.gdk.CAP_ROUND,
-                gtk.gdk.JOIN_BEVEL)
-        ex, ey = self._end.entry_point(SIZE)
-        ox, oy = self._output.exit_point(SIZE)
-        self._pixmap.draw_line(ngc, ox, oy, ex, ey)
-
-        ws = []
-        for n in self._neurons:
-            ws += n.weights()
-        m, M = min(ws), max(ws)
+        edges = self._edges(layers)
+        m = min(min(weights) for (n, weights, rw) in edges)
+        M = max(max(weights) for (n, weights, rw) in edges)
         N = normalizer.Normalizer(m, M, -1, 1)
 
-        for n in self._neurons:
-            ex, ey = n.entry_point(SIZE)
-            for (nn, w) in zip(n.inputs(), n.weights()):
+        # changed edges, grouped by colour
+        segments = {}
+        lines = {}
+        k = 0
+        for (j, (n, weights, rw)) in enumerate(edges):
+            segs, line = self._geometry[j]
+            for (seg, w) in zip(segs, weights):
                 _w = N.normalize(w)
-                if _w < 0:
-                    ngc.set_rgb_fg_color(gtk.gdk.Color(red=abs(_w)))
-                else:
-                    ngc.set_rgb_fg_color(gtk.gdk.Color(green=_w))
-                sx, sy = nn.exit_point(SIZE)
-                self._pixmap.draw_line(ngc, sx, sy, ex, ey)
-            rw = n.recurrent_weight()
-            if rw:
-                _w = N.normalize(rw)
-                sx, sy = n.exit_point(SIZE)
-                if rw < 0:
-                    ngc.set_rgb_fg_color(gtk.gdk.Color(red=abs(_w)))
-                else:
-                    ngc.set_rgb_fg_color(gtk.gdk.Color(green=_w))
-                line = [(sx, sy),
-                        (sx + RPAD, sy - SIZE / 2),
-                        (sx - SIZE / 2, sy - SIZE / 2 - RPAD),
-                        (ex - RPAD, ey - SIZE / 2),
-                        (ex, ey)]
-                self._pixmap.draw_lines(ngc, line)
-
+                c = (_w < 0, int(round(abs(_w) * LEVELS)))
+                if self._colours[k] != c:
+                    self._colours[k] = c
+                    segments.setdefault(c, []).append(seg)
+                k += 1
+            if line:
+                if rw:
+                    c = (rw < 0, int(round(abs(N.normalize(rw)) * LEVELS)))
+                    if self._colours[k] != c:
+                        self._colours[k] = c
+                        lines.setdefault(c, []).append(line)
+                k += 1
+
+        if not segments and not lines:
+            return
+        for c in set(segments) | set(lines):
+            self._gc.set_rgb_fg_color(self._colour(c))
+            if c in segments:
+                self._pixmap.draw_segments(self._gc, segments[c])
+            for line in lines.get(c, []):
+                self._pixmap.draw_lines(self._gc, line)
         self._img.set_from_pixmap(self._pixmap, None)
 
     def build_basic_network(self, N, inputs, h1, hidden1, h2, hidden2,
-            output, end):
+            outputs, ends):
         """
         Places the nodes from the neural network at specific positions, being
-        ready to draw them afterwards.
+        ready to draw them afterwards. There's an end for each output neuron.
         """
-        m = max(N, h1, h2) + 1
+        m = max(N, h1, h2, len(outputs)) + 1
         self._W = m * (SIZE + PAD) + PAD
         m = 5 if (h1 and h2) else 4 if (h1 or h2) else 3
         self._H = m * (SIZE + PAD) + PAD
-        self._do_cleanup_draw()
 
+        self._pos = {}
         x = PAD
         self._place(inputs, x)
         x += PAD + SIZE
@@ -96,14 +101,139 @@ class Grapher(object):
         x += PAD + SIZE if h1 else 0
         self._place(hidden2, x)
         x += PAD + SIZE if h2 else 0
-        self._place([output], x)
+        self._place(outputs, x)
         x += PAD + SIZE
-        self._place([end], x)
+        self._place(ends, x)
+
+        self._neurons = hidden1 + hidden2 + outputs
+        self._layers = [[n for n in l if n.inputs()]
+                for l in (hidden1, hidden2, outputs) if l]
+        self._ends = ends
+        self._outputs = outputs
+        self._units = inputs + self._neurons + ends
+        self._build_geometry()
+        self._background = None
+
+    def _build_geometry(self):
+        """
+        Computes the segments of the edges entering each neuron and the line
+        of its recurrent edge (None if not recurrent).
+        """
+        self._geometry = []
+        count = 0
+        for l in self._layers:
+            for n in l:
+                ex, ey = self._entry_point(n)
+                segs = []
+                for nn in n.inputs():
+                    sx, sy = self._exit_point(nn)
+                    segs.append((sx, sy, ex, ey))
+                line = None
+                if n.recurrent_weight() is not None:
+                    sx, sy = self._exit_point(n)
+                    line = [(sx, sy),
+                            (sx + RPAD, sy - SIZE / 2),
+                            (sx - SIZE / 2, sy - SIZE / 2 - RPAD),
+                            (ex - RPAD, ey - SIZE / 2),
+                            (ex, ey)]
+                    count += 1
+                self._geometry.append((segs, line))
+                count += len(segs)
+        self._count = count
+
+    def _draw_background(self):
+        """
+        Draws the units (which never change) in the background pixmap and
+        starts the graph from it, without any edge.
+        """
+        win = self._w.get_window()
+        self._background = gtk.gdk.Pixmap(win, self._H, self._W)
+        gc = self._w.get_style().bg_gc[gtk.STATE_NORMAL]
+        self._background.draw_rectangle(gc, True, 0, 0, self._H, self._W)
+
+        gc = self._w.get_style().black_gc
+        pcon = self._w.get_pango_context()
+        for n in self._units:
+            self._draw_unit(n, gc, pcon)
+
+        self._gc = win.new_gc()
+        self._gc.copy(gc)
+        self._gc.set_line_attributes(2, gtk.gdk.LINE_SOLID, gtk.gdk.CAP_ROUND,
+                gtk.gdk.JOIN_BEVEL)
+        for (o, e) in zip(self._outputs, self._ends):
+            ex, ey = self._entry_point(e)
+            ox, oy = self._exit_point(o)
+            self._background.draw_line(self._gc, ox, oy, ex, ey)
+
+        if not self._pixmap:
+            self._pixmap = gtk.gdk.Pixmap(win, self._H, self._W)
+        self._pixmap.draw_drawable(gc, self._background, 0, 0, 0, 0, -1, -1)
+        self._colours = [None] * self._count
+        self._cache = {}
+
+    def _draw_unit(self, u, gc, pcon):
+        """
+        Draws a unit in the background pixmap: a shape depending on its kind
+        and a label.
+        """
+        x, y = self._pos[u]
+        p = self._background
+        if isinstance(u, Fixed):
+            p.draw_rectangle(gc, False, x, y, SIZE, SIZE)
+            text = '1'
+        elif isinstance(u, Pattern):
+            p.draw_polygon(gc, False, [(x, y), (x + SIZE, y + SIZE / 2),
+                (x, y + SIZE)])
+            text = '>'
+        elif isinstance(u, Output):
+            p.draw_polygon(gc, False, [(x + SIZE - 10, y),
+                (x - 10, y + SIZE / 2), (x + SIZE - 10, y + SIZE)])
+            text = '='
+        else:
+            p.draw_arc(gc, False, x, y, SIZE, SIZE, 0, 64 * 360)
+            text = '' if isinstance(u, Neuron) else u.name()
+        l = pango.Layout(pcon)
+        l.set_text(text)
+        p.draw_layout(gc, x + SIZE / 4, y + SIZE / 4, l)
+
+    def _exit_point(self, u):
+        """
+        Returns the point where the edges leaving a unit start.
+        """
+        x, y = self._pos[u]
+        return (x + SIZE, y + SIZE / 2)
+
+    def _entry_point(self, u):
+        """
+        Returns the point where the edges entering a unit end.
+        """
+        x, y = self._pos[u]
+        if isinstance(u, Output):
+            x -= 10
+        return (x, y + SIZE / 2)
+
+    def _colour(self, c):
+        """
+        Returns the gtk colour of a shade: (negative, level).
+        """
+        if c not in self._cache:
+            v = float(c[1]) / LEVELS
+            self._cache[c] = gtk.gdk.Color(red=v) if c[0] else gtk.gdk.Color(green=v)
+        return self._cache[c]
 
-        self._neurons = hidden1 + hidden2 + [output]
-        self._end = end
-        self._output = output
-        self._units = inputs + self._neurons + [end]
+    def _edges(self, layers):
+        """
+        Returns (neuron, weights, recurrent weight) for each neuron, the
+        weights taken from layers or, if None, from the neurons.
+        """
+        if layers is None:
+            return [(n, n.weights(), n.recurrent_weight())
+                    for l in self._layers for n in l]
+        edges = []
+        for (l, (W, S)) in zip(self._layers, layers):
+            for (j, n) in enumerate(l):
+                edges.append((n, W[j], S[j] if S is not None else None))
+        return edges
 
     def _place(self, elems, x):
         """
@@ -112,15 +242,5 @@ class Grapher(object):
         a = len(elems) * (SIZE + PAD) + PAD
         y = (self._W - a) / 2 + PAD
         for n in elems:
-            n.place(x, y)
+            self._pos[n] = (x, y)
             y += SIZE + PAD
-
-    def _do_cleanup_draw(self):
-        """
-        Does the initial drawing of the network, cleaning the drawing area.
-        """
-        if not self._pixmap:
-            self._pixmap = gtk.gdk.Pixmap(self._w.get_window(), self._H, self._W)
-        gc = self._w.get_style().bg_gc[gtk.STATE_NORMAL]
-        self._pixmap.draw_rectangle(gc, True, 0, 0, self._H, self._W)
-
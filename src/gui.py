@@ -9,6 +9,9 @@ import logging
 
 import config
 import network
+import profiling
+import saver
+import trainer
 
 from globaldefs import *
 
@@ -30,8 +33,8 @@ class MainWindow(gtk.Window):
         self.set_icon_from_file(ICON_FILE)
         self.connect('delete_event', self.__on_exit)
 
+        self._trainer = None
         self._nw = None
-        self._inhibit = False
 
         self._build_gui()
 
@@ -109,45 +112,129 @@ class MainWindow(gtk.Window):
         """
         self._pBar.set_fraction(p)
 
-    def __step(self):
-        if self._inhibit:
-            self._inhibit = False
-            return False
+    def __step(self, nw, budget):
+        """
+        Called whenever the GUI is idle, when learning without a thread:
+        learns for budget seconds, then lets the GUI redraw.
+        """
+        if nw is not self._nw:
+            return False # cancelled
 
-        r = self._nw.learn_step()
+        r = nw.learn_step(budget)
+        self.__show_profile(nw)
         if r:
-            self._md = gtk.MessageDialog(self, gtk.DIALOG_DESTROY_WITH_PARENT,
-                gtk.MESSAGE_INFO, gtk.BUTTONS_CLOSE,
-                'Network predicts {0} ± {1:.2}%'.format(
-                    r['predicted'], 100*r['err']))
-            self._md.connect('response', self.__close_modal)
-            self._md.show_all()
-            self._md.show()
             self._nw = None
+            self.__show_modal(gtk.MESSAGE_INFO, self.__result_text(r))
             return False
         return True
 
+    def __refresh(self, t):
+        """
+        Called at most once per frame while learning: redraws the network
+        from the latest snapshot of the weights and updates the progress.
+        When the learning is over, shows the results.
+        """
+        if t is not self._trainer:
+            return False # cancelled
+
+        done = t.done() # checked first, to draw the final snapshot
+        s = t.snapshot()
+        if s:
+            t.network().draw(s)
+        self.notify_progress(t.progress())
+        self.__show_profile(t.network())
+        if not done:
+            return True
+
+        self._trainer = None
+        if t.error():
+            t.network().close()
+            self.__show_modal(gtk.MESSAGE_ERROR,
+                    'Learning failed: {0}'.format(t.error()))
+            return False
+        r = t.network().finish()
+        self.__show_modal(gtk.MESSAGE_INFO, self.__result_text(r))
+        return False
+
+    def __result_text(self, r):
+        """
+        Returns the text showing the result of a learning.
+        """
+        if r['spread']:
+            text = 'Ensemble predicts {0} ± {1:.5} (error {2:.2}%)'.format(
+                    r['predicted'], r['spread'][0], 100*r['err'])
+        else:
+            text = 'Network predicts {0} ± {1:.2}%'.format(r['predicted'],
+                    100*r['err'])
+        if len(r['forecast']) > 1:
+            text += '\nNext values: {0}'.format(', '.join(
+                '{0:.5}'.format(v) for v in r['forecast']))
+        if len(r['forecast']) > 1 and r['spread']:
+            text += '\nSpreads: {0}'.format(', '.join(
+                '{0:.5}'.format(v) for v in r['spread']))
+        if r['validation'] is not None:
+            text += '\nValidation error: {0:.5}'.format(r['validation'])
+        if r['profile']:
+            text += '\n\n' + profiling.summary(r['profile'])
+        return text
+
+    def __show_profile(self, nw):
+        """
+        Shows where the learning spends its time in the progress bar, if the
+        learning is profiled.
+        """
+        p = nw.profiler()
+        if p and p.short():
+            self._pBar.set_text(p.short())
+
+    def __show_modal(self, kind, text):
+        """
+        Shows the result of the learning.
+        """
+        self._md = gtk.MessageDialog(self, gtk.DIALOG_DESTROY_WITH_PARENT,
+            kind, gtk.BUTTONS_CLOSE, text)
+        self._md.connect('response', self.__close_modal)
+        self._md.show_all()
+        self._md.show()
+
     def __close_modal(self, widget, data=None):
         """
-        Closes the prediction result dialog.
+        Closes the prediction result dialog, reporting the results which
+        couldn't be saved.
         """
         self._md.destroy()
         self._pBar.set_fraction(0)
+        self._pBar.set_text('Learning progress')
         self._graph.set_from_file(ICON_FILE)
+        errors = saver.wait()
+        if errors:
+            md = gtk.MessageDialog(self, gtk.DIALOG_DESTROY_WITH_PARENT,
+                    gtk.MESSAGE_WARNING, gtk.BUTTONS_CLOSE, '\n'.join(errors))
+            md.run()
+            md.destroy()
 
     def __on_exit(self, widget, data=None):
         """
         Called when destroying the main window. Leave the gtk threads (and
         finish application).
         """
+        if self._trainer:
+            self._trainer.cancel()
+        if self._nw:
+            self._nw.close()
         gtk.main_quit()
 
     def __on_new(self, widget, data=None):
         """
-        Called when the user issues a request for a new game.
+        Called when the user issues a request for a new game. The learning
+        in progress, if any, is abandoned.
         """
+        if self._trainer:
+            self._trainer.cancel()
+            self._trainer = None
         if self._nw:
-            self._inhibit = True
+            self._nw.close()
+            self._nw = None
 
         cfg = config.Config(self, TITLE)
         cfg.display()
@@ -155,10 +242,16 @@ class MainWindow(gtk.Window):
         cfg.destroy()
 
         if r:
-            self._nw = network.Network(r, self, self._graph)
-            glib.timeout_add(100, self.__step)
+            nw = network.Network(r, self, self._graph)
+            if r['tick']:
+                self._nw = nw
+                glib.idle_add(self.__step, nw, r['tick'] / 1000.0)
+            else:
+                self._trainer = trainer.Trainer(nw)
+                self._trainer.start()
+                glib.timeout_add(int(1000 * trainer.INTERVAL), self.__refresh,
+                        self._trainer)
         else:
-            self._nw = None
             self._graph.set_from_file(ICON_FILE)
 
     def __on_about(self, widget, data=None):
@@ -194,6 +287,7 @@ def main():
     gtk.gdk.threads_enter()
     gtk.main()
     gtk.gdk.threads_leave()
+    saver.wait()
     logging.shutdown()
 
 if __name__ == '__main__':
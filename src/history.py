@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Compact binary history of the learning: for each step the RMS and,
+optionally, all the weights of the network.
+
+The file starts with a header:
+
+    magic       8 bytes, 'BPHIST01'
+    flags       uint32, HAS_WEIGHTS | HAS_RECURRENT
+    layers      uint32, number of layers L
+    capacity    uint64, number of steps the file has room for
+    count       uint64, number of steps written
+    shapes      L pairs of uint32 (neurons, inputs) for each layer
+
+followed by capacity fixed size records (little endian doubles): the RMS,
+then the weight matrices of the layers, then the recurrent weights of the
+layers. The file is preallocated and written through a memory map; it is
+truncated to the written steps when closed.
+"""
+
+import struct
+
+import numpy
+
+MAGIC = 'BPHIST01'
+HAS_WEIGHTS = 1
+HAS_RECURRENT = 2
+
+_HEAD = struct.Struct('<8sIIQQ')
+_CAPACITY_OFFSET = 16
+_COUNT_OFFSET = 24
+
+def _record_type(flags, shapes):
+    """
+    Returns the numpy type of a record.
+    """
+    fields = [('rms', '<f8')]
+    if flags & HAS_WEIGHTS:
+        fields += [('w{0}'.format(k), '<f8', s) for (k, s) in enumerate(shapes)]
+        if flags & HAS_RECURRENT:
+            fields += [('s{0}'.format(k), '<f8', (s[0],))
+                    for (k, s) in enumerate(shapes)]
+    return numpy.dtype(fields)
+
+def _header_size(layers):
+    """
+    Size of the header (a multiple of 8 bytes).
+    """
+    return _HEAD.size + 8 * layers
+
+class HistoryWriter(object):
+    """
+    Writes the history of the learning, one step at a time.
+    """
+
+    def __init__(self, fName, capacity, shapes, recurrent, weights, start=0):
+        """
+        Creates the file, with room for capacity steps.
+
+        fName       name of the file
+        capacity    expected number of steps (the file grows if needed)
+        shapes      (neurons, inputs) for each layer
+        recurrent   True if the network has recurrent weights
+        weights     True if the weights are saved, not only the RMS
+        start       number of steps already done (when the learning is
+                    resumed): the first start steps of an existing history
+                    of the same network are kept
+        """
+        self._fName = fName
+        self._shapes = [tuple(s) for s in shapes]
+        self._flags = 0
+        if weights:
+            self._flags |= HAS_WEIGHTS
+            if recurrent:
+                self._flags |= HAS_RECURRENT
+        self._type = _record_type(self._flags, self._shapes)
+        self._offset = _header_size(len(self._shapes))
+        self._count = 0
+
+        if start and self._resume(start):
+            self._map(max(capacity, self._count, 1))
+            return
+        with open(fName, 'wb') as f:
+            f.write(_HEAD.pack(MAGIC, self._flags, len(self._shapes), 0, 0))
+            for s in self._shapes:
+                f.write(struct.pack('<II', *s))
+        self._map(max(capacity, 1))
+
+    def write(self, rms, layers=None):
+        """
+        Writes the data of one step.
+
+        rms     the RMS of the step
+        layers  list of (weights, recurrent weights) for each layer, the
+                recurrent weights being None for a non recurrent network;
+                ignored if the weights are not saved
+        """
+        if self._count == self._capacity:
+            self._map(2 * self._capacity)
+        r, i = self._records, self._count
+        r['rms'][i] = rms
+        if self._flags & HAS_WEIGHTS:
+            for (k, (w, s)) in enumerate(layers):
+                r['w{0}'.format(k)][i] = w
+                if self._flags & HAS_RECURRENT:
+                    r['s{0}'.format(k)][i] = s
+        self._count += 1
+        self._header[0] = self._count
+
+    def close(self):
+        """
+        Flushes the data and truncates the file to the written steps.
+        """
+        self._records.flush()
+        self._header.flush()
+        del self._records, self._header
+        self._set_capacity(self._count)
+
+    def _resume(self, start):
+        """
+        Keeps the first start steps of the existing file, if it is a history
+        of the same network. Returns True if kept.
+        """
+        try:
+            with open(self._fName, 'rb') as f:
+                head = f.read(_HEAD.size)
+                magic, flags, layers, capacity, count = _HEAD.unpack(head)
+                shapes = [struct.unpack('<II', f.read(8)) for k in range(layers)]
+        except (IOError, struct.error):
+            return False
+        if magic != MAGIC or flags != self._flags or shapes != self._shapes:
+            return False
+        self._count = min(start, count)
+        return True
+
+    def _map(self, capacity):
+        """
+        (Re)maps the file, making room for capacity steps.
+        """
+        if hasattr(self, '_records'):
+            self._records.flush()
+            del self._records, self._header
+        self._set_capacity(capacity)
+        self._records = numpy.memmap(self._fName, self._type, 'r+',
+                self._offset, (capacity,))
+        self._header = numpy.memmap(self._fName, '<u8', 'r+', _COUNT_OFFSET,
+                (1,))
+        self._header[0] = self._count
+
+    def _set_capacity(self, capacity):
+        """
+        Resizes the file to hold capacity steps. Must be called while the
+        file is not mapped.
+        """
+        with open(self._fName, 'r+b') as f:
+            f.truncate(self._offset + capacity * self._type.itemsize)
+            f.seek(_CAPACITY_OFFSET)
+            f.write(struct.pack('<Q', capacity))
+        self._capacity = capacity
+
+def read_history(fName):
+    """
+    Reads a history file. The arrays are mapped from the file, not read in
+    memory.
+
+    return  dictionary with 'rms' (array of steps), 'weights' (list with an
+            array of (steps, neurons, inputs) for each layer, None if the
+            weights were not saved) and 'recurrent' (list with an array of
+            (steps, neurons) for each layer, None if the network was not
+            recurrent or the weights were not saved)
+    """
+    with open(fName, 'rb') as f:
+        magic, flags, layers, capacity, count = _HEAD.unpack(f.read(_HEAD.size))
+        if magic != MAGIC:
+            raise ValueError("{0} is not a history file".format(fName))
+        shapes = [struct.unpack('<II', f.read(8)) for k in range(layers)]
+
+    t = _record_type(flags, shapes)
+    r = {'rms': numpy.empty(0), 'weights': None, 'recurrent': None}
+    if not count:
+        return r
+    records = numpy.memmap(fName, t, 'r', _header_size(layers), (count,))
+    r['rms'] = records['rms']
+    if flags & HAS_WEIGHTS:
+        r['weights'] = [records['w{0}'.format(k)] for k in range(layers)]
+        if flags & HAS_RECURRENT:
+            r['recurrent'] = [records['s{0}'.format(k)] for k in range(layers)]
+    return r
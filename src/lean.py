@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Lean learning engine, in pure Python (for when numpy is missing).
+
+The outputs of all the units of the network (inputs, bias units and neurons)
+are kept in a single flat list, as are the errors received by the neurons;
+each neuron only holds its weights (and momentum deltas) in compact arrays
+and the positions of its inputs in the list (shared by the neurons with the
+same inputs, i.e. by all the neurons of a layer). The neurons have no instance
+dictionary and nothing about drawing. The arrays of weights are the ones of
+the neurons of the object graph (still drawn and saved), not copies. The
+computations are exactly the ones of units.Neuron, done in the same order,
+so the results are the same.
+"""
+
+from array import array
+
+class Neuron(object):
+    """
+    A neuron of the lean engine.
+    """
+    __slots__ = ('index', 'inputs', 'targets', 'weights', 'selfw', 'ow', 'sow',
+            'factor')
+
+    def __init__(self, index, inputs, targets, n):
+        """
+        index   position of the output (and error) of the neuron
+        inputs  positions of its inputs, the bias being the last one
+                (array('i'))
+        targets positions of the neurons to which the error is reported
+                (array('i'))
+        n       units.Neuron whose arrays of weights (and deltas) are used
+        """
+        self.index = index
+        self.inputs = inputs
+        self.targets = targets
+        self.weights = n.weights()
+        self.selfw = n.recurrent_weight()
+        self.factor = 0
+        m = n.momentum_weights()
+        if m:
+            self.ow = m[0]
+            self.sow = m[1]
+
+class Lean(object):
+    """
+    Pure Python equivalent of the Neuron object graph, with the same
+    interface as engine.Engine (learning online only).
+    """
+
+    def __init__(self, layers, activation, momentum, eta, alpha):
+        """
+        Builds the engine from the already constructed neurons (starting from
+        their weights and state).
+
+        layers      list of layers, each a list of Neuron (no Fixed units)
+        activation  activations.Activation
+        momentum    True if momentum is used
+        eta         learning rate
+        alpha       momentum rate
+        """
+        self._act = activation
+        self._momentum = momentum
+        self._ETA = eta
+        self._ETA_ALPHA = eta * alpha
+        self._recurrent = layers[0][0].recurrent_weight() is not None
+
+        self._values = []
+        self._errors = []
+        slots = {}
+        def slot(u):
+            if u not in slots:
+                slots[u] = len(self._values)
+                self._values.append(u.value())
+                self._errors.append(0)
+            return slots[u]
+
+        # the first layer gets the patterns (and the bias), the others the
+        # outputs of the neurons of the previous one (and its bias)
+        self._pattern = [slot(u) for u in layers[0][0].inputs()[:-1]]
+        self._layers = []
+        positions = {}
+        for (k, l) in enumerate(layers):
+            ns = []
+            for n in l:
+                inputs = tuple(slot(u) for u in n.inputs())
+                if inputs not in positions:
+                    positions[inputs] = (array('i', inputs),
+                            array('i', inputs[:-1] if k else ()))
+                ln = Neuron(slot(n), positions[inputs][0],
+                        positions[inputs][1], n)
+                self._values[ln.index], self._errors[ln.index] = n.state()
+                ns.append(ln)
+            self._layers.append(ns)
+        self._outputs = [n.index for n in self._layers[-1]]
+
+        self._data = None
+
+    def load_data(self, data):
+        """
+        Uses a learning set.
+
+        data    dataset.Windows
+        """
+        self._data = data
+
+    def present(self, pattern):
+        """
+        Presents a pattern to the network, returning the output (a list if
+        there are more outputs).
+        """
+        self._forward(pattern)
+        if len(self._outputs) == 1:
+            return self._values[self._outputs[0]]
+        return [self._values[i] for i in self._outputs]
+
+    def learn_pattern(self, pattern, desired):
+        """
+        Presents a pattern and learns from its error. Returns the error (a
+        list if there are more outputs, desired being a sequence too).
+        """
+        self._forward(pattern)
+        if len(self._outputs) == 1:
+            desired = (desired,)
+        errors = [self._values[i] - d for (i, d) in zip(self._outputs, desired)]
+        self._backpropagate(errors)
+        return errors[0] if len(errors) == 1 else errors
+
+    def learn_epoch(self, batch=1):
+        """
+        Does one learning step over the entire learning set, returning the
+        sum of the squared errors of each output, as a list. The learning is
+        always online, batch is ignored.
+        """
+        sse = [0] * len(self._outputs)
+        for (inp, out) in self._data:
+            errors = self.learn_pattern(inp, out)
+            if len(sse) == 1:
+                errors = (errors,)
+            for (h, e) in enumerate(errors):
+                sse[h] += e * e
+        return sse
+
+    def evaluate(self, data):
+        """
+        Returns the sum of the squared errors of each output over a learning
+        set, as a list, without learning from it. The outputs kept for a
+        recurrent network are restored afterwards.
+
+        data    dataset.Windows
+        """
+        saved = self._values[:]
+        sse = [0] * len(self._outputs)
+        for (inp, out) in data:
+            y = self.present(inp)
+            if len(sse) == 1:
+                y, out = (y,), (out,)
+            for (h, (v, d)) in enumerate(zip(y, out)):
+                sse[h] += (v - d) * (v - d)
+        self._values[:] = saved
+        return sse
+
+    def set_weights(self, layers):
+        """
+        Replaces the weights, given like layer_weights returns them.
+        """
+        for (l, (W, S)) in zip(self._layers, layers):
+            for (j, n) in enumerate(l):
+                n.weights[:] = array('d', W[j])
+                if self._recurrent:
+                    n.selfw = S[j]
+
+    def layer_weights(self):
+        """
+        Returns (weights, recurrent weights) for each layer, the recurrent
+        weights being None if the network is not recurrent. The weights of
+        each neuron are not copied.
+        """
+        return [([n.weights for n in l],
+            [n.selfw for n in l] if self._recurrent else None)
+            for l in self._layers]
+
+    def layer_momentum(self):
+        """
+        Returns the last deltas of the weights, used for the momentum, in the
+        same form as layer_weights; None if momentum is not used.
+        """
+        if not self._momentum:
+            return None
+        return [([n.ow for n in l],
+            [n.sow for n in l] if self._recurrent else None)
+            for l in self._layers]
+
+    def rescale_inputs(self, a, b):
+        """
+        Changes the first layer such that the network computes the same
+        outputs when each input x is replaced by a * x + b, like
+        units.Neuron.rescale_inputs.
+        """
+        for n in self._layers[0]:
+            ws = [n.weights]
+            if self._momentum:
+                ws.append(n.ow)
+            for w in ws:
+                s = sum(w[:-1])
+                for i in range(len(w) - 1):
+                    w[i] /= a
+                w[-1] -= b * s / a
+            for i in range(len(n.weights)):
+                n.weights[i] = max(-1, min(1, n.weights[i]))
+
+    def store(self, layers, state=False):
+        """
+        Writes the recurrent weights back into the neurons of the object
+        graph (the other weights are shared with them).
+
+        state   if True, everything else needed to continue the learning
+                with the neurons is also written: outputs, errors and the
+                recurrent deltas
+        """
+        for (l, ns) in zip(layers, self._layers):
+            for (n, ln) in zip(l, ns):
+                n.set_weights(ln.weights, ln.selfw)
+                if not state:
+                    continue
+                n.set_state(self._values[ln.index], self._errors[ln.index])
+                if self._momentum:
+                    n.set_momentum_weights(ln.ow,
+                            ln.sow if self._recurrent else None)
+
+    def _forward(self, pattern):
+        """
+        Presents a pattern to the network, like units.Neuron.compute_output
+        for each neuron.
+        """
+        v = self._values
+        for (i, x) in zip(self._pattern, pattern):
+            v[i] = x
+        output_and_factor = self._act.output_and_factor
+        for l in self._layers:
+            for n in l:
+                s = 0
+                if n.selfw:
+                    s += n.selfw * v[n.index]
+                for (w, i) in zip(n.weights, n.inputs):
+                    s += w * v[i]
+                v[n.index], n.factor = output_and_factor(s)
+
+    def _backpropagate(self, errors):
+        """
+        Does the backpropagation of the errors of the outputs, like
+        units.Neuron.report_and_learn_from_error for each neuron, from the
+        output layer to the first hidden one.
+        """
+        v, errs = self._values, self._errors
+        ETA, ETA_ALPHA, momentum = self._ETA, self._ETA_ALPHA, self._momentum
+        for (i, e) in zip(self._outputs, errors):
+            errs[i] += e
+        for l in reversed(self._layers):
+            for n in l:
+                err = errs[n.index]
+                ws, ow = n.weights, n.ow if momentum else None
+                for (w, i) in zip(ws, n.targets):
+                    errs[i] += w * err
+                sw = n.selfw
+                if sw:
+                    e = sw * err
+
+                g = ETA * err * n.factor
+                if momentum:
+                    for (j, i) in enumerate(n.inputs):
+                        ow[j] = delta = g * v[i] + ETA_ALPHA * ow[j]
+                        w = ws[j] - delta
+                        ws[j] = -1 if w < -1 else 1 if w > 1 else w
+                else:
+                    for (j, i) in enumerate(n.inputs):
+                        w = ws[j] - g * v[i]
+                        ws[j] = -1 if w < -1 else 1 if w > 1 else w
+                if sw:
+                    delta = g * v[n.index]
+                    if momentum:
+                        delta += ETA_ALPHA * n.sow
+                        n.sow = delta
+                    sw -= delta
+                    if sw < -1:
+                        sw = -1
+                    if sw > 1:
+                        sw = 1
+                    n.selfw = sw
+
+                errs[n.index] = 0
+                if sw:
+                    errs[n.index] += e
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+A learnt network, as data: topology, activation, normalization and weights.
+It can be saved in a compact binary file and loaded back to predict, without
+the learning set and without building the graph of neurons.
+
+The binary file starts with a header:
+
+    magic       8 bytes, 'BPMODEL2'
+    flags       uint32, HAS_RECURRENT | HAS_MOMENTUM
+    N, h1, h2   3 uint32, the topology
+    outputs     uint32, number of output neurons
+    activation  16 bytes, name of the activation (padded with zeros)
+    data range  2 doubles, (min, max) of the data, before normalization
+
+followed by little endian doubles: for each layer (from the first hidden one
+to the output) the weight matrix (one row per neuron, the bias last) and
+the recurrent weights; then, in the same order, the momentum of the weights
+and of the recurrent weights. Files starting with 'BPMODEL1' (written before
+the networks could have more outputs) have no outputs field and only one
+output neuron.
+
+A model can also forecast many windows or series at once (forecast_windows,
+forecast_series): with numpy, all of them go through each layer in a single
+matrix product.
+"""
+
+import array
+import struct
+import sys
+
+import activations
+import normalizer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None # the bulk forecasts present the patterns one by one
+
+MAGIC = 'BPMODEL2'
+MAGIC1 = 'BPMODEL1'
+HAS_RECURRENT = 1
+HAS_MOMENTUM = 2
+NAME_SIZE = 16 # bytes for the name of the activation
+
+_HEAD = struct.Struct('<8sIIIII{0}sdd'.format(NAME_SIZE))
+_HEAD1 = struct.Struct('<8sIIII{0}sdd'.format(NAME_SIZE))
+
+def _names(N, h1, h2, outputs):
+    """
+    Returns the names of the units of each layer, as given by the network:
+    inputs, hidden layers (each ending with its Fixed unit), output neurons
+    and ends of the network.
+    """
+    units = [['i{0}'.format(i) for i in range(N)] + ['fi']]
+    if h1:
+        units.append(['h1{0}'.format(i) for i in range(h1)] + ['fh1'])
+    if h2:
+        units.append(['h2{0}'.format(i) for i in range(h2)] + ['fh2'])
+    if outputs == 1:
+        units.append(['o'])
+        units.append(['e'])
+    else:
+        units.append(['o{0}'.format(i) for i in range(outputs)])
+        units.append(['e{0}'.format(i) for i in range(outputs)])
+    return units
+
+class Model(object):
+    """
+    The data of a learnt network.
+    """
+
+    def __init__(self, N, h1, h2, activation, data_range, layers,
+            momentum=None):
+        """
+        N, h1, h2   topology
+        activation  name of the activation function
+        data_range  (min, max) of the data, before normalization
+        layers      (weights, recurrent weights) for each layer, as returned
+                    by Network.layer_weights
+        momentum    momentum of the weights, in the same form, or None
+        """
+        self._N, self._h1, self._h2 = N, h1, h2
+        self._activation = activations.get(activation)
+        self._range = tuple(data_range)
+        self._layers = [([list(row) for row in W],
+            list(S) if S is not None else None) for (W, S) in layers]
+        self._momentum = None
+        if momentum:
+            self._momentum = [([list(row) for row in W],
+                list(S) if S is not None else None) for (W, S) in momentum]
+        self._recurrent = self._layers[0][1] is not None
+        self._outputs = len(self._layers[-1][0])
+        self._normalizer = normalizer.Normalizer(self._range[0],
+                self._range[1], *self._activation.domain)
+        self._arrays = None
+        self.reset()
+
+    def topology(self):
+        return (self._N, self._h1, self._h2)
+
+    def outputs(self):
+        return self._outputs
+
+    def activation(self):
+        return self._activation.name
+
+    def data_range(self):
+        return self._range
+
+    def normalizer(self):
+        return self._normalizer
+
+    def layers(self):
+        return self._layers
+
+    def momentum(self):
+        return self._momentum
+
+    def reset(self):
+        """
+        Forgets the outputs of the previous patterns (only matters for a
+        recurrent network).
+        """
+        self._values = [[0] * len(W) for (W, S) in self._layers]
+
+    def present(self, pattern):
+        """
+        Presents a normalized pattern, returning the normalized output (a
+        list of outputs if there are more).
+        """
+        x = list(pattern)
+        f = self._activation.output
+        for (k, (W, S)) in enumerate(self._layers):
+            x.append(1) # bias
+            v = []
+            for (j, w) in enumerate(W):
+                s = 0
+                if S and S[j]:
+                    s += S[j] * self._values[k][j]
+                for (wi, xi) in zip(w, x):
+                    s += wi * xi
+                v.append(f(s))
+            self._values[k] = v
+            x = v
+        return x[0] if self._outputs == 1 else x
+
+    def forecast(self, values):
+        """
+        Returns the value following the last N values of the series.
+        """
+        return self.rollout(values, 1)[0]
+
+    def rollout(self, values, H):
+        """
+        Returns the H values following the last N values of the series, the
+        forecasts being fed back as the last values of the next window (all
+        the outputs at once, if there are more).
+        """
+        n = self._normalizer
+        x = map(n.normalize, values[-self._N:])
+        ys = []
+        while len(ys) < H:
+            y = self.present(x)
+            ys.extend([y] if self._outputs == 1 else y)
+            x = (x + ys[-self._outputs:])[-self._N:]
+        return map(n.recast, ys[:H])
+
+    def forecast_windows(self, windows):
+        """
+        Forecasts the value following each of many windows of N values, all
+        of them at once. The windows are independent: a recurrent network
+        starts from no previous outputs for each of them.
+
+        windows     sequence of windows (only the last N values are used)
+        return      list of forecasts, one for each window
+        """
+        return [r[0] for r in self.rollout_windows(windows, 1)]
+
+    def forecast_series(self, series):
+        """
+        Forecasts the value following each of many series, all of them at
+        once. For a recurrent network the windows of each series are
+        presented in order, at each step the same window for all the series
+        (the series are aligned at their end, a shorter one starts later);
+        otherwise only the last window of each series matters.
+
+        series  sequence of series, each having at least N values
+        return  list of forecasts, one for each series
+        """
+        return [r[0] for r in self.rollout_series(series, 1)]
+
+    def rollout_windows(self, windows, H):
+        """
+        Like forecast_windows, but forecasts H values after each window (see
+        rollout), all the windows going through each step at once.
+
+        return  list of H forecasts for each window
+        """
+        if any(len(w) < self._N for w in windows):
+            raise ValueError("Each window needs {0} values".format(self._N))
+        if not len(windows):
+            return []
+        if numpy is None:
+            results = []
+            for w in windows:
+                self.reset()
+                results.append(self.rollout(w, H))
+            self.reset()
+            return results
+        xs = numpy.array([w[-self._N:] for w in windows], dtype=float)
+        return self._rollout_all(self._normalizer.normalize_all(xs), None, H)
+
+    def rollout_series(self, series, H):
+        """
+        Like forecast_series, but forecasts H values after each series (see
+        rollout), all the series going through each step at once. For a
+        recurrent network the previous outputs are carried from the windows
+        of the series through all the steps.
+
+        return  list of H forecasts for each series
+        """
+        N = self._N
+        if not self._recurrent:
+            return self.rollout_windows(series, H)
+        if any(len(s) < N for s in series):
+            raise ValueError("Each series needs at least {0} values".format(N))
+        if not len(series):
+            return []
+        n = self._normalizer
+        if numpy is None:
+            results = []
+            for s in series:
+                self.reset()
+                for i in range(len(s) - N):
+                    self.forecast(s[i:i + N])
+                results.append(self.rollout(s, H))
+            self.reset()
+            return results
+
+        T = max(map(len, series)) - N + 1 # windows of the longest series
+        xs = numpy.zeros((len(series), T + N - 1))
+        starts = numpy.empty(len(series), dtype=int)
+        for (i, s) in enumerate(series):
+            starts[i] = T + N - 1 - len(s)
+            xs[i, starts[i]:] = n.normalize_all(s)
+        values = None
+        for t in range(T - 1):
+            vs = self._present_all(xs[:, t:t + N], values)
+            if t < starts.max():
+                # the series not started yet keep no previous outputs
+                active = (starts <= t)[:, None]
+                vs = [numpy.where(active, v, 0) for v in vs]
+            values = vs
+        return self._rollout_all(xs[:, T - 1:], values, H)
+
+    def _rollout_all(self, xs, values, H):
+        """
+        Forecasts H values after each of many normalized windows (the rows of
+        xs) at once, starting from the given previous outputs (see
+        _present_all). Returns the recast forecasts, as lists.
+        """
+        K, N = self._outputs, self._N
+        ys = numpy.empty((len(xs), H + K))
+        for h in range(0, H, K):
+            vs = self._present_all(xs, values)
+            ys[:, h:h + K] = vs[-1]
+            if self._recurrent:
+                values = vs
+            xs = numpy.column_stack((xs, vs[-1]))[:, -N:]
+        return self._normalizer.recast_all(ys[:, :H]).tolist()
+
+    def _layer_arrays(self):
+        """
+        Returns (weights without the bias, bias, recurrent weights or None)
+        for each layer, as arrays.
+        """
+        if self._arrays is None:
+            self._arrays = []
+            for (W, S) in self._layers:
+                W = numpy.array(W, dtype=float)
+                self._arrays.append((W[:, :-1].T.copy(), W[:, -1].copy(),
+                    numpy.array(S, dtype=float) if S is not None else None))
+        return self._arrays
+
+    def _present_all(self, xs, values=None):
+        """
+        Presents many normalized patterns (the rows of xs) at once.
+
+        values  previous outputs of each layer, one row for each pattern
+                (None for no previous outputs)
+        return  the outputs of each layer, one row for each pattern
+        """
+        f = self._activation.outputs
+        vs = []
+        for (k, (W, b, S)) in enumerate(self._layer_arrays()):
+            s = numpy.dot(xs, W) + b
+            if S is not None and values is not None:
+                s += S * values[k]
+            xs = f(s)
+            vs.append(xs)
+        return vs
+
+    def table(self):
+        """
+        Returns the weights as the ASCII table saved by the program: one row
+        and one column for each unit, the cell of a row holding the weight
+        of the edge coming from the unit of the column.
+        """
+        K = self._outputs
+        units = _names(self._N, self._h1, self._h2, K)
+        names = sum(units, [])
+        lname = max(map(len, names)) + 4
+        l = max(lname, 7)
+        t = (1 + len(names)) * (l + 1) + 1
+        sep = '{0:-^{1}}'.format('', t)
+        empty = '{0:^{1}}|'.format('', l)
+
+        lines = [sep, '|{0:^{1}}|'.format('', lname) +
+                ''.join('{0:^{1}}|'.format(n, l) for n in names), sep]
+        # each end only has the edge from its output neuron
+        ends = [[1 if i == j else None for i in range(K)] for j in range(K)]
+        rows = [None] + [W for (W, S) in self._layers] + [ends]
+        offset = 0 # column of the first unit of the previous layer
+        for (k, layer) in enumerate(units):
+            if k:
+                # the neurons of a layer only have edges from the previous one
+                prev = len(units[k - 1])
+                before = empty * offset
+                after = empty * (len(names) - offset - prev)
+                offset += prev
+            for (j, name) in enumerate(layer):
+                s = '|{0:^{1}}|'.format(name, lname)
+                if k and j < len(rows[k]):
+                    s += before + ''.join(empty if w is None else
+                            '{0:^+{1}.2}|'.format(w + 0.0, l)
+                            for w in rows[k][j]) + after
+                else:
+                    s += empty * len(names)
+                lines.append(s)
+                lines.append(sep)
+        return '\n'.join(lines) + '\n'
+
+def save(fName, model):
+    """
+    Writes a model to a binary file. The name of its activation must fit in
+    NAME_SIZE bytes (a ValueError is raised otherwise).
+    """
+    if len(model.activation()) > NAME_SIZE:
+        raise ValueError("The name of the activation {0} is longer than {1} "
+                "bytes".format(model.activation(), NAME_SIZE))
+    flags = 0
+    if model._recurrent:
+        flags |= HAS_RECURRENT
+    if model._momentum:
+        flags |= HAS_MOMENTUM
+
+    values = array.array('d')
+    parts = [model._layers]
+    if model._momentum:
+        parts.append(model._momentum)
+    for layers in parts:
+        for (W, S) in layers:
+            for row in W:
+                values.extend(row)
+            if model._recurrent:
+                values.extend(S)
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    N, h1, h2 = model.topology()
+    with open(fName, 'wb') as f:
+        f.write(_HEAD.pack(MAGIC, flags, N, h1, h2, model.outputs(),
+            model.activation(), *model.data_range()))
+        values.tofile(f)
+
+def load(fName):
+    """
+    Reads a model from a binary file.
+    """
+    with open(fName, 'rb') as f:
+        magic = f.read(len(MAGIC))
+        head = _HEAD if magic == MAGIC else _HEAD1 if magic == MAGIC1 else None
+        if head:
+            data = magic + f.read(head.size - len(magic))
+        if not head or len(data) != head.size:
+            raise ValueError("{0} is not a network file".format(fName))
+        if head is _HEAD:
+            magic, flags, N, h1, h2, K, name, m, M = head.unpack(data)
+        else:
+            magic, flags, N, h1, h2, name, m, M = head.unpack(data)
+            K = 1
+        values = array.array('d', f.read())
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    shapes = []
+    inputs = N + 1
+    for h in (h1, h2, K):
+        if h:
+            shapes.append((h, inputs))
+            inputs = h + 1
+
+    pos = [0]
+    def take(n):
+        pos[0] += n
+        return values[pos[0] - n:pos[0]].tolist()
+    def layers():
+        return [([take(i) for j in range(n)],
+            take(n) if flags & HAS_RECURRENT else None) for (n, i) in shapes]
+
+    ws = layers()
+    ms = layers() if flags & HAS_MOMENTUM else None
+    if pos[0] != len(values):
+        raise ValueError("{0} is not a valid network file".format(fName))
+    return Model(N, h1, h2, name.rstrip('\0'), (m, M), ws, ms)
@@ -3,50 +3,53 @@
 # (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
 #
 
+import copy
 import logging
 import math
+import time
 
-import grapher
+import activations
+import checkpoint
+import dataset
+import lean
+import model
 import normalizer
+import profiling
 import saver
 from units import *
 
-def log(x):
-    """
-    Normal logistic function. Output in [0, 1].
-    """
-    return 1 / ( 1 + math.exp(-x))
+try:
+    import engine
+    import history
+except ImportError:
+    # no numpy, only the object graph can be used, without a binary history
+    engine = history = None
 
-def dlog(x):
+def domain(activation):
     """
-    Derivative of the above function.
+    Returns the range of values (min, max) of an activation function, given
+    by its configuration name. The data is normalized to this range.
     """
-    return log(x) * (1 - log(x))
+    return activations.get(activation).domain
 
-def log2(x):
+def held_out(windows, fraction):
     """
-    Logistic function with output in [-1, 1].
+    Returns how many of the windows of a series are held out for validation
+    (the last ones), for the fraction given in the configuration: at least
+    one if the fraction is not 0.
     """
-    return 1 - 2 * log(x)
+    if fraction <= 0:
+        return 0
+    return max(int(round(windows * fraction)), 1)
 
-def dlog2(x):
+def normalize(data, dom_min, dom_max):
     """
-    Derivative of the above function.
-    """
-    return -2 * log(x) * (1 - log(x))
+    Normalizes the data to the range of an activation function.
 
-def th(x):
-    """
-    tanh function.
-    """
-    return math.tanh(x)
-
-def dth(x):
-    """
-    Derivative of the above function.
+    return  (normalizer, normalized data)
     """
-    t = th(x)
-    return 1 - t * t
+    n = normalizer.Normalizer(min(data), max(data), dom_min, dom_max)
+    return (n, map(n.normalize, data))
 
 class Network(object):
     """
@@ -57,11 +60,18 @@ class Network(object):
     problem). All other methods are auxiliary.
     """
 
-    def __init__(self, config, gui, graph):
+    def __init__(self, config, gui, graph, state=None):
         """
         Builds the network.
 
-        config  User configuration.
+        config  User configuration. If its baseName is None nothing is
+                written to disk (neither the log nor the results). It can
+                also hold the data already normalized, as a (normalizer,
+                normalized data) tuple under the 'normalized' key.
+        gui     Window notified about the progress (None if headless).
+        graph   gtk.Image where the network is drawn (None if headless).
+        state   State of the same network (see state), to resume an
+                interrupted learning; None to start from random weights.
         """
         self._gui = gui
         self._parse_network(config)
@@ -69,60 +79,430 @@ class Network(object):
         self._prepare_data(config)
         self._runs = config['runs']
         self._baseName = config['baseName']
-        self._grapher = grapher.Grapher(graph, gui)
+        self._grapher = None
+        if graph:
+            # imported here to be able to run without a display
+            import grapher
+            self._grapher = grapher.Grapher(graph, gui)
         self._do_build_nw()
         self._it = 0
-        self._logger = logging.getLogger(LOGNAME)
-        self._logger.addHandler(logging.FileHandler(self._baseName + LOG_SUFFIX))
         self._rms = []
+        self._hrms = [] # RMS of each output, if there are more
         self._orms = 0
-        self._grapher.graph()
+        self._vrms = [] # (step, validation RMS) for each validation
+        self._best = None # (validation RMS, weights) of the best validation
+        self._bad = 0 # validations since the best one
+        self._ensemble = None # state of all the members, to resume an ensemble
+        self._done = False
+        if state:
+            self._restore(state)
+        self._parse_engine(config)
+        self._logger = logging.getLogger(LOGNAME)
+        self._handler = None
+        if self._baseName and self._trace:
+            self._logger.setLevel(logging.INFO)
+            self._handler = logging.FileHandler(self._baseName + LOG_SUFFIX)
+            self._logger.addHandler(self._handler)
+        self._open_history(config)
+        self._open_checkpoint(config, state is not None)
+        self._start_profiling(config)
+        self._graph()
 
     def baseName(self):
         return self._baseName
 
     def drawable(self):
-        return self._grapher.drawable()
+        return self._grapher.drawable() if self._grapher else None
 
     def neurons(self):
-        return self._inputs + self._hidden1 + self._hidden2 + [self._output, self._end]
+        return self._inputs + self._hidden1 + self._hidden2 + self._outputs + self._ends
 
     def orig_data(self):
         return self._orig_data
 
-    def learn_step(self):
+    def learn_step(self, budget=0):
         """
-        Bootstraps the learning phase.
+        Bootstraps the learning phase: does as many learning steps as fit in
+        the time budget (at least one), then redraws the network and notifies
+        the progress, once.
+
+        budget  seconds to spend learning
+        return  None if the learning continues, the results (see finish)
+                after the last step
+        """
+        end = time.time() + budget
+        done = self.learn_epoch()
+        while not done and time.time() < end:
+            done = self.learn_epoch()
+        self._graph()
+        if self._gui:
+            self._gui.notify_progress(self.progress())
+        if done:
+            return self.finish()
+        return None
+
+    def learn_epoch(self):
+        """
+        Does one learning step, without drawing anything or notifying the
+        GUI, so it can be called from another thread than the GUI one.
+
+        return  True if this was the last step
         """
         rms = self._do_one_learning_step()
-        done = rms < self._MIN_RMS or abs(rms - self._orms) < self._MIN_DRMS
+        self._done = rms < self._MIN_RMS or abs(rms - self._orms) < self._MIN_DRMS
         self._orms = rms
+        self._it += 1
+        if self._valid and self._it % self._validate_every == 0:
+            self._done = self._validate() or self._done
+        if self._checkpoint:
+            self._checkpoint.step(self)
+        return self._done or self._it >= self._runs
+
+    def rms(self):
+        """
+        Returns the RMS of each learning step done so far.
+        """
+        return self._rms
+
+    def profiler(self):
+        """
+        Returns the profiler timing the phases of the learning (see
+        profiling.Profiler), None if the learning is not profiled.
+        """
+        return self._profiler
+
+    def progress(self):
+        """
+        Returns the progress of the learning, between 0 and 1.
+        """
+        return 1 if self._done else (self._it - 1.0) / self._runs
+
+    def finish(self):
+        """
+        Ends the learning: predicts the next value and saves all the results.
+        If some windows were held out for validation, the network goes back
+        to the weights with the best validation RMS first.
+
+        return  dictionary with the predicted value ('predicted'), all the
+                forecast values, up to the horizon ('forecast'), their
+                spread over the members of an ensemble ('spread', None for a
+                single network), the last RMS ('err'), the best validation
+                RMS ('validation', None if nothing was held out) and the
+                time spent in each phase ('profile', see
+                profiling.Profiler.totals, None if the learning is not
+                profiled)
+        """
+        if self._best:
+            self._set_layer_weights(self._best[1])
+            self._graph() # the saved drawing shows the restored weights
+        if self._engine:
+            self._engine.store(self._neuron_layers())
+        results, forecast, spread = self._predict()
+        if self._baseName:
+            s = saver.Save(self, results, forecast, spread)
+            save = s.save_all
+            if self._profiler:
+                save = self._profiler.wrap('save', save)
+            save()
+        if self._checkpoint:
+            self._checkpoint.close(True) # not needed anymore
+            self._checkpoint = None
+        self.close()
+        return {'predicted': forecast[0], 'forecast': forecast,
+                'spread': spread, 'err': self._rms[-1],
+                'validation': self._best[0] if self._best else None,
+                'profile': self._profiler.totals() if self._profiler else None}
+
+    def close(self):
+        """
+        Closes the log and the binary history, waits for the last checkpoint
+        and dumps the cProfile stats. Called when the learning is finished or
+        abandoned.
+        """
+        if self._profiler:
+            self._profiler.close()
+        if self._checkpoint:
+            self._checkpoint.close()
+            self._checkpoint = None
+        if self._handler:
+            self._logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+        if self._history:
+            self._history.close()
+            self._history = None
+
+    def state(self):
+        """
+        Returns a copy of everything needed to continue the learning later:
+        the weights, momentum deltas, outputs and carried errors of all the
+        neurons, the RMS history (also of each output), the validations and
+        the step, and all the members of an ensemble. Only built from Python
+        lists and numbers.
+        """
+        if self._engine:
+            self._engine.store(self._neuron_layers(), True)
+        neurons = []
+        for l in self._neuron_layers():
+            for n in l:
+                m = n.momentum_weights()
+                neurons.append((list(n.weights()), n.recurrent_weight(),
+                    list(m[0]) if m else None, m[1] if m else None) +
+                    n.state())
+        return {'topology': (self._N, self._h1, self._h2),
+                'outputs': self._nout,
+                'members': self._members,
+                'ensemble': self._engine.state() if self._members > 1 else None,
+                'activation': self._activation.name,
+                'recurrent': self._recurrent,
+                'momentum': self._momentum,
+                'it': self._it,
+                'orms': self._orms,
+                'rms': list(self._rms),
+                'hrms': list(self._hrms),
+                'vrms': list(self._vrms),
+                'best': self._best,
+                'bad': self._bad,
+                'neurons': neurons}
+
+    def _restore(self, state):
+        """
+        Restores a state returned by state into the neurons.
+        """
+        mine = ((self._N, self._h1, self._h2), self._nout, self._members,
+                self._activation.name, self._recurrent, self._momentum)
+        theirs = (tuple(state['topology']), state.get('outputs', 1),
+                state.get('members', 1), state['activation'],
+                state['recurrent'], state['momentum'])
+        if mine != theirs:
+            raise ValueError("The state is for another network")
+        self._it = state['it']
+        self._orms = state['orms']
+        self._rms = list(state['rms'])
+        self._hrms = list(state.get('hrms', []))
+        self._vrms = list(state.get('vrms', []))
+        self._best = state.get('best')
+        self._bad = state.get('bad', 0)
+        self._ensemble = state.get('ensemble')
+        neurons = [n for l in self._neuron_layers() for n in l]
+        for (n, (w, sw, ow, sow, value, err)) in zip(neurons, state['neurons']):
+            n.set_weights(w, sw)
+            if self._momentum:
+                n.set_momentum_weights(ow, sow)
+            n.set_state(value, err)
+
+    def _weights_copy(self):
+        """
+        Returns a copy of the weights of all layers (see layer_weights), as
+        Python lists and numbers. For an ensemble, the weights of all the
+        members are copied (see engine.Ensemble.members).
+        """
+        if self._members > 1:
+            return [(W.tolist(), S.tolist() if S is not None else None)
+                    for (W, S) in self._engine.members()]
+        return [([[float(w) for w in row] for row in W],
+            [float(s) for s in S] if S is not None else None)
+            for (W, S) in self.layer_weights()]
+
+    def _set_layer_weights(self, layers):
+        """
+        Replaces the weights of all layers, given like layer_weights returns
+        them.
+        """
+        if self._engine:
+            self._engine.set_weights(layers)
+            return
+        for (l, (W, S)) in zip(self._neuron_layers(), layers):
+            for (j, n) in enumerate(l):
+                n.set_weights(W[j], S[j] if S is not None else None)
+
+    def _validate(self):
+        """
+        Computes the RMS over the validation windows, remembering the weights
+        if it is the best one so far.
 
+        return  True if the learning should stop: the RMS did not improve
+                for patience validations
+        """
+        if self._engine:
+            sse = self._engine.evaluate(self._valid)
+        else:
+            sse = self._evaluate(self._valid)
+        rms = math.sqrt(sum(sse) / (len(self._valid) * self._nout))
+        self._vrms.append((self._it, rms))
+        if self._trace:
+            self._logger.info('Validation RMS: {0}'.format(rms))
+        if not self._best or rms < self._best[0]:
+            self._best = (rms, self._weights_copy())
+            self._bad = 0
+        else:
+            self._bad += 1
+        return self._patience > 0 and self._bad >= self._patience
+
+    def _evaluate(self, data):
+        """
+        Returns the sum of the squared errors of each output over a set of
+        windows, without learning from them. The outputs of the neurons are
+        restored afterwards, so a recurrent network goes on learning from
+        where it was.
+        """
+        neurons = [n for l in self._neuron_layers() for n in l]
+        states = [n.state() for n in neurons]
+        sse = [0] * self._nout
+        for (inp, out) in data:
+            y = self._forward(inp)
+            if self._nout == 1:
+                y, out = (y,), (out,)
+            for (h, (v, d)) in enumerate(zip(y, out)):
+                sse[h] += (v - d) * (v - d)
+        for (n, s) in zip(neurons, states):
+            n.set_state(*s)
+        return sse
+
+    def snapshot(self):
+        """
+        Returns a copy of the weights of all layers (see layer_weights),
+        which can be drawn while the learning goes on.
+        """
+        return copy.deepcopy(self.layer_weights())
+
+    def draw(self, layers):
+        """
+        Draws the network with the weights from a snapshot.
+        """
+        if self._grapher:
+            self._grapher.graph(layers)
+
+    def _graph(self):
+        """
+        Redraws the network, if there is somewhere to draw it.
+        """
+        if not self._grapher:
+            return
+        if self._engine:
+            self._engine.store(self._neuron_layers())
         self._grapher.graph()
-        f = (self._it + 0.0) / self._runs if not done else 1
-        self._it += 1
-        self._gui.notify_progress(f)
-
-        if self._it >= self._runs or done:
-            results, predicted = self._predict()
-            s = saver.Save(self, results + [predicted])
-            s.save_all()
-            r = {'predicted':predicted, 'err': self._rms[-1]}
-            return r
-        return None
+
+    def layer_weights(self):
+        """
+        Returns (weights, recurrent weights) for each layer of neurons, from
+        the first hidden one to the output. The weights of a layer are a
+        matrix with a row for each neuron and a column for each input (the
+        bias being the last one); the recurrent weights are None if the
+        network is not recurrent.
+        """
+        if self._engine:
+            return self._engine.layer_weights()
+        return [([n.weights() for n in l],
+                [n.recurrent_weight() for n in l] if self._recurrent else None)
+                for l in self._neuron_layers()]
+
+    def layer_momentum(self):
+        """
+        Returns the last deltas of the weights, used for the momentum, in the
+        same form as layer_weights; None if momentum is not used.
+        """
+        if not self._momentum:
+            return None
+        if self._engine:
+            return self._engine.layer_momentum()
+        ms = [[n.momentum_weights() for n in l] for l in self._neuron_layers()]
+        return [([ow for (ow, sow) in l],
+                [sow for (ow, sow) in l] if self._recurrent else None)
+                for l in ms]
+
+    def model(self):
+        """
+        Returns a copy of the learnt network as a model.Model, which can be
+        saved and loaded back to predict.
+        """
+        return model.Model(self._N, self._h1, self._h2,
+                self._activation.name, self._normalizer.data_range(),
+                self.layer_weights(), self.layer_momentum())
+
+    def forecast(self, pattern):
+        """
+        Presents a pattern (already normalized) to the network and returns
+        the output (the first one, for the next value, if there are more),
+        recast to the range of the original data.
+        """
+        y = self._forward(pattern)
+        return self._normalizer.recast(y if self._nout == 1 else y[0])
+
+    def rollout(self, pattern, H):
+        """
+        Forecasts H values after a pattern (already normalized), the outputs
+        being fed back as the last inputs of the next pattern. A recurrent
+        network goes on from its last outputs. Returns the forecasts,
+        recast to the range of the original data.
+        """
+        x = list(pattern)
+        ys = []
+        while len(ys) < H:
+            y = self._forward(x)
+            ys.extend([y] if self._nout == 1 else y)
+            x = (x + ys[-self._nout:])[-self._N:]
+        return map(self._normalizer.recast, ys[:H])
+
+    def _forward(self, pattern):
+        """
+        Presents a pattern (already normalized) to the network and returns
+        the output, normalized (a sequence if there are more outputs).
+        """
+        if self._engine:
+            return self._engine.present(pattern)
+        self._present_pattern(pattern)
+        if self._nout == 1:
+            return self._ends[0].value()
+        return [e.value() for e in self._ends]
+
+    def learn_pattern(self, pattern, expected):
+        """
+        Presents a pattern (already normalized) to the network and learns
+        from the error, which is returned. If there are more outputs, both
+        the expected values and the errors are sequences.
+        """
+        if self._engine:
+            return self._engine.learn_pattern(pattern, expected)
+        if self._nout == 1:
+            expected = (expected,)
+        for (end, d) in zip(self._ends, expected):
+            end.set_desired(d)
+        self._present_pattern(pattern)
+        errors = [end.get_error() for end in self._ends]
+        self._backpropagate()
+        return errors[0] if self._nout == 1 else errors
+
+    def rescale_inputs(self, a, b):
+        """
+        Changes the first layer of the network such that it computes the same
+        outputs when each (normalized) input x is replaced by a * x + b: used
+        when the normalization of the data changes.
+        """
+        if self._engine:
+            self._engine.rescale_inputs(a, b)
+        else:
+            for n in self._neuron_layers()[0]:
+                n.rescale_inputs(a, b)
+
+    def normalizer(self):
+        return self._normalizer
 
     def _predict(self):
         """
-        After learning phase is ended, predict the next value and return the
-        results for each pattern.
+        After learning phase is ended, predict the next values (up to the
+        horizon) and return the results for each pattern. An ensemble
+        forecasts the mean of the values forecast by its members, their
+        standard deviation being the spread of each value.
+
+        return  (results, forecast values, spread or None)
         """
-        results = []
-        for (inp, out) in self._data:
-            self._end.set_desired(out)
-            self._present_pattern(inp)
-            results.append(self._normalizer.recast(self._end.value()))
-        self._present_pattern(self._question)
-        return (results, self._normalizer.recast(self._end.value()))
+        results = [self.forecast(inp) for (inp, out) in self._data]
+        if self._members == 1:
+            return (results, self.rollout(self._question, self._horizon), None)
+        ys = self._normalizer.recast_all(
+                self._engine.rollout(self._question, self._horizon))
+        return (results, ys.mean(axis=0).tolist(), ys.std(axis=0).tolist())
 
     def _present_pattern(self, pattern):
         """
@@ -134,14 +514,17 @@ class Network(object):
             n.compute_output()
         for n in self._hidden2:
             n.compute_output()
-        self._output.compute_output()
+        for n in self._outputs:
+            n.compute_output()
 
     def _backpropagate(self):
         """
         Does the backpropagation.
         """
-        self._end.report_and_learn_from_error()
-        self._output.report_and_learn_from_error()
+        for e in self._ends:
+            e.report_and_learn_from_error()
+        for n in self._outputs:
+            n.report_and_learn_from_error()
         for n in self._hidden2:
             n.report_and_learn_from_error()
         for n in self._hidden1:
@@ -152,42 +535,121 @@ class Network(object):
         Does one learning step, controlling each neuron in the network and
         updating the weights and the logs.
         """
-        rms = 0
-        self._logger.info('Step {0} starting'.format(self._it))
-        for (inp, out) in self._data:
-            self._logger.info('input: {0}, expected: {1}'.format(inp, out))
-            self._end.set_desired(out)
-            self._present_pattern(inp)
-            e = self._end.get_error()
-            rms += e * e
-            self._backpropagate()
-        rms /= len(self._data)
-        rms = math.sqrt(rms)
-
-        self._logger.info('===================')
-        self._logger.info('RMS: {0}'.format(rms))
-        self._logger.info('===================')
-        self._logger.info('')
+        if self._trace:
+            self._logger.info('Step {0} starting'.format(self._it))
+        if self._engine:
+            sse = self._engine.learn_epoch(self._batch)
+        else:
+            sse = [0] * self._nout
+            trace = self._trace >= TRACE_WEIGHTS
+            for (inp, out) in self._learn:
+                if trace:
+                    self._logger.info('input: {0}, expected: {1}'.format(inp, out))
+                errors = self.learn_pattern(inp, out)
+                if self._nout == 1:
+                    errors = (errors,)
+                for (h, e) in enumerate(errors):
+                    sse[h] += e * e
+        P = len(self._learn)
+        rms = math.sqrt(sum(sse) / (P * self._nout))
+        if self._nout > 1:
+            self._hrms.append([math.sqrt(s / P) for s in sse])
+
+        if self._trace:
+            self._logger.info('===================')
+            self._logger.info('RMS: {0}'.format(rms))
+            self._logger.info('===================')
+            self._logger.info('')
         self._rms.append(rms)
+        if self._history:
+            layers = self.layer_weights() if self._history_weights else None
+            self._history.write(rms, layers)
         return rms
 
     def _parse_activation(self, config):
         """
-        Gets the activation function, its derivative and domain.
+        Gets the activation function and its domain.
         """
-        self._dom_max = 1
-        self._dom_min = -1
+        self._activation = activations.get(config['activation'])
+        self._dom_min, self._dom_max = self._activation.domain
 
-        if config['activation'] == 'log':
-            self._f = log
-            self._df = dlog
-            self._dom_min = 0 # the single function with domain in [0, 1]
-        elif config['activation'] == '2log':
-            self._f = log2
-            self._df = dlog2
+    def _parse_engine(self, config):
+        """
+        Selects the engine used for learning: the object graph from units.py,
+        the vectorized one from engine.py or an ensemble of networks learnt
+        at once (both need numpy), or the lean one from lean.py.
+        """
+        self._engine = None
+        if self._members > 1:
+            self._engine = engine.Ensemble(self._neuron_layers(),
+                    self._members, self._mW, self._MW, self._activation,
+                    self._momentum, self._eta, self._alpha, self._ensemble)
+            self._engine.load_data(self._learn)
+        elif config['engine'] == 'numpy':
+            self._engine = engine.Engine(self._neuron_layers(),
+                    self._activation, self._momentum, self._eta, self._alpha)
+            self._engine.load_data(self._learn)
+        elif config['engine'] == 'lean':
+            self._engine = lean.Lean(self._neuron_layers(),
+                    self._activation, self._momentum, self._eta, self._alpha)
+            self._engine.load_data(self._learn)
+
+    def _open_history(self, config):
+        """
+        Opens the binary history of the learning, if one is requested.
+        """
+        self._history = None
+        self._history_weights = config['history'] >= HISTORY_WEIGHTS
+        if not self._baseName or not config['history']:
+            return
+        self._history = history.HistoryWriter(self._baseName + HISTORY_SUFFIX,
+                self._runs, [(len(w), len(w[0])) for (w, s) in self.layer_weights()],
+                self._recurrent, self._history_weights, self._it)
+
+    def _start_profiling(self, config):
+        """
+        Starts timing the phases of the learning, if requested, by wrapping
+        the methods doing them. The cProfile stats go next to the log.
+        """
+        self._profiler = None
+        if not config['profile'] and not config['cprofile']:
+            return
+        fName = self._baseName + PROFILE_SUFFIX if self._baseName else None
+        p = profiling.Profiler(config['cprofile'], fName)
+        if self._engine:
+            e = self._engine
+            for (phase, names) in [
+                    ('forward', ('_forward', '_present_block')),
+                    ('backward', ('_backpropagate', '_backpropagate_block',
+                        '_update_block'))]:
+                for name in names:
+                    if hasattr(e, name): # an Ensemble only learns online
+                        setattr(e, name, p.wrap(phase, getattr(e, name)))
         else:
-            self._f = th
-            self._df = dth
+            self._present_pattern = p.wrap('forward', self._present_pattern)
+            self._backpropagate = p.wrap('backward', self._backpropagate)
+        if self._handler:
+            self._handler.handle = p.wrap('logging', self._handler.handle)
+        if self._history:
+            self._history.write = p.wrap('logging', self._history.write)
+        if self._grapher:
+            self._grapher.graph = p.wrap('graph', self._grapher.graph)
+        self.learn_epoch = p.wrap_step(self.learn_epoch, lambda: self._it)
+        self._profiler = p
+
+    def _open_checkpoint(self, config, resumed):
+        """
+        Starts saving checkpoints, if requested. If the learning is resumed
+        from a checkpoint, it will be removed at the end even if no new
+        checkpoints are saved.
+        """
+        self._checkpoint = None
+        if not self._baseName or not (config['checkpoint'] or
+                config['checkpoint_time'] or resumed):
+            return
+        self._checkpoint = checkpoint.Checkpointer(
+                self._baseName + CHECKPOINT_SUFFIX, config['checkpoint'],
+                config['checkpoint_time'])
 
     def _parse_network(self, config):
         """
@@ -214,29 +676,60 @@ class Network(object):
         self._eta = config['eta']
         self._alpha = config['alpha']
 
+        # patterns per weight update (1 is online, 0 full batch)
+        self._batch = config['batch']
+
+        # what to log: nothing, a summary of each step or everything
+        self._trace = config['trace']
+        self._neuron = TracedNeuron if self._trace >= TRACE_WEIGHTS else Neuron
+
         # rms params
         self._MIN_RMS = config['min_rms']
         self._MIN_DRMS = config['min_delta_rms']
 
+        # output neurons, for the next values of the series
+        self._nout = config['outputs']
+
+        # values forecast after the series
+        self._horizon = config['horizon']
+
+        # networks learnt at once, from different random weights
+        self._members = config['ensemble']
+
+        # validation on the last windows: which fraction, how often (steps)
+        # and after how many validations without improvement to stop
+        self._validation = config['validation']
+        self._validate_every = config['validate_every']
+        self._patience = config['patience']
+
     def _prepare_data(self, config):
         """
-        Reads learning set, normalizing it and preparing the auxiliary lists
-        to be used while learning.
+        Reads learning set, normalizing it and preparing the windows of
+        the series used while learning (the windows are not copied). The
+        last windows can be held out, for validation.
         """
         self._orig_data = data = config['data']
 
-        # ranges
-        data_max = max(data)
-        data_min = min(data)
-        self._normalizer = normalizer.Normalizer(
-                data_min, data_max, self._dom_min, self._dom_max)
-
-        ndata = map(lambda x: self._normalizer.normalize(x), data)
-
-        self._data = map(
-                lambda x: (ndata[x:x+self._N], ndata[x+self._N]),
-                range(len(ndata) - self._N))
-        self._question = ndata[-self._N:]
+        if 'normalized' in config:
+            self._normalizer, ndata = config['normalized']
+        else:
+            self._normalizer, ndata = normalize(data,
+                    self._dom_min, self._dom_max)
+
+        self._data = dataset.Windows(ndata, self._N, self._nout)
+        self._question = self._data.question()
+
+        self._learn = self._data
+        self._valid = None
+        V = held_out(len(self._data), self._validation)
+        if V:
+            P = len(ndata) - V
+            self._learn = dataset.Windows(ndata[:P], self._N, self._nout)
+            self._valid = dataset.Windows(ndata[P - self._N - self._nout + 1:],
+                    self._N, self._nout)
+        if not len(self._learn):
+            raise ValueError("Nothing to learn: the series is too short or "
+                    "all its windows are held out")
 
     def _do_build_nw(self):
         """
@@ -246,11 +739,25 @@ class Network(object):
         self.__build_hidden1()
         self.__build_hidden2()
         self.__build_output()
-        self._grapher.build_basic_network(
-                self._N, self._inputs,
-                self._h1, self._hidden1,
-                self._h2, self._hidden2,
-                self._output, self._end)
+        if self._grapher:
+            self._grapher.build_basic_network(
+                    self._N, self._inputs,
+                    self._h1, self._hidden1,
+                    self._h2, self._hidden2,
+                    self._outputs, self._ends)
+
+    def _neuron_layers(self):
+        """
+        Returns the layers of actual neurons (without the Fixed units), from
+        the first hidden one to the output.
+        """
+        layers = []
+        if self._h1:
+            layers.append(self._hidden1[:-1])
+        if self._h2:
+            layers.append(self._hidden2[:-1])
+        layers.append(self._outputs)
+        return layers
 
     def __build_inputs(self):
         """
@@ -268,8 +775,8 @@ class Network(object):
         """
         self._hidden1 = []
         for i in range(self._h1):
-            n = Neuron(self._mW, self._MW, self._f, self._df, self._momentum,
-                    'h1{0}'.format(i), self._eta, self._alpha)
+            n = self._neuron(self._mW, self._MW, self._activation,
+                    self._momentum, 'h1{0}'.format(i), self._eta, self._alpha)
             n.set_recurrent(self._recurrent)
             for inp in self._inputs:
                 n.connect(inp)
@@ -283,8 +790,8 @@ class Network(object):
         """
         self._hidden2 = []
         for i in range(self._h2):
-            n = Neuron(self._mW, self._MW, self._f, self._df, self._momentum,
-                    'h2{0}'.format(i), self._eta, self._alpha)
+            n = self._neuron(self._mW, self._MW, self._activation,
+                    self._momentum, 'h2{0}'.format(i), self._eta, self._alpha)
             n.set_recurrent(self._recurrent)
             if self._h1:
                 for inp in self._hidden1:
@@ -298,20 +805,25 @@ class Network(object):
 
     def __build_output(self):
         """
-        Builds the output layer and the end of the network.
+        Builds the output layer and the end of the network: an output neuron
+        (and an end) for each value following the window.
         """
-        self._output = Neuron(self._mW, self._MW, self._f, self._df,
-                self._momentum, 'o', self._eta, self._alpha)
-        self._output.set_recurrent(self._recurrent)
         if self._h2:
-            for inp in self._hidden2:
-                self._output.connect(inp)
+            inputs = self._hidden2
         elif self._h1:
-            for inp in self._hidden1:
-                self._output.connect(inp)
+            inputs = self._hidden1
         else:
-            for inp in self._inputs:
-                self._output.connect(inp)
-
-        self._end = Output(self._output, 'e')
+            inputs = self._inputs
+
+        self._outputs = []
+        self._ends = []
+        for h in range(self._nout):
+            suffix = str(h) if self._nout > 1 else ''
+            n = self._neuron(self._mW, self._MW, self._activation,
+                    self._momentum, 'o' + suffix, self._eta, self._alpha)
+            n.set_recurrent(self._recurrent)
+            for inp in inputs:
+                n.connect(inp)
+            self._outputs.append(n)
+            self._ends.append(Output(n, 'e' + suffix))
 
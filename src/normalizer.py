@@ -3,6 +3,11 @@
 # (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
 #
 
+try:
+    import numpy
+except ImportError:
+    numpy = None # the *_all methods return lists
+
 DELTA = .01
 EPS = .1
 REPS = 1 / EPS
@@ -16,11 +21,17 @@ class Normalizer(object):
         """
         Builds a normalizer object.
         """
-        self._md = min_data
-        self._Md = max_data
         d = EPS * (max_range - min_range)
         self._mr = min_range + d
         self._Mr = max_range - d
+        self._fit(min_data, max_data)
+
+    def _fit(self, min_data, max_data):
+        """
+        Sets the range of the data.
+        """
+        self._md = min_data
+        self._Md = max_data
 
         if self._md > self._Md - DELTA:
             self._md = self._Md - DELTA # ensure a valid normalization range
@@ -28,6 +39,12 @@ class Normalizer(object):
         self._ETA = (self._Mr - self._mr) / (self._Md - self._md)
         self._RETA = 1 / self._ETA
 
+    def data_range(self):
+        """
+        Returns the (min, max) range of the data.
+        """
+        return (self._md, self._Md)
+
     def normalize(self, x):
         """
         Normalizes a value.
@@ -40,3 +57,65 @@ class Normalizer(object):
         """
         return self._md + self._RETA * (x - self._mr)
 
+    def recast_error(self, e):
+        """
+        Retransforms a difference between normalized values (an error) to
+        the scale of the original values.
+        """
+        return self._RETA * e
+
+    def normalize_all(self, xs):
+        """
+        Normalizes a sequence of values. Returns an array (a list if numpy is
+        missing).
+        """
+        if numpy is None:
+            return map(self.normalize, xs)
+        return self.normalize(numpy.asarray(xs, dtype=float))
+
+    def recast_all(self, xs):
+        """
+        Retransforms a sequence of normalized values. Returns an array (a list
+        if numpy is missing).
+        """
+        if numpy is None:
+            return map(self.recast, xs)
+        return self.recast(numpy.asarray(xs, dtype=float))
+
+class RunningNormalizer(Normalizer):
+    """
+    Normalizer for a series whose values keep arriving: the range of the
+    data is extended when a value falls outside it.
+    """
+
+    def __init__(self, min_data, max_data, min_range, max_range, growth=.1):
+        """
+        growth  fraction of the new range added on the side of the new
+                value when extending, to avoid extending for each new extreme
+        """
+        super(RunningNormalizer, self).__init__(min_data, max_data,
+                min_range, max_range)
+        self._growth = growth
+
+    def update(self, x):
+        """
+        Extends the range of the data to include a new value.
+
+        return  None if the range did not change, otherwise (a, b) such that
+                a value normalized before the change becomes a * v + b
+        """
+        md, Md = self._md, self._Md
+        if md <= x <= Md:
+            return None
+
+        ETA = self._ETA
+        if x < md:
+            md = x - self._growth * (Md - x)
+        else:
+            Md = x + self._growth * (x - md)
+        omd = self._md
+        self._fit(md, Md)
+
+        # from v = ETA * (y - omd) + mr to v' = ETA' * (y - md) + mr
+        a = self._ETA / ETA
+        return (a, self._mr * (1 - a) + self._ETA * (omd - self._md))
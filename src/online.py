@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Online learning for series which never end: the network keeps learning as
+new values arrive, forecasting the next value after each one.
+"""
+
+import collections
+
+import network
+import normalizer
+
+class OnlineForecaster(object):
+    """
+    Learns a series one value at a time.
+
+    The network is first learnt from an initial part of the series (the
+    warm-up, given as the data of the configuration), which also gives the
+    initial normalization. Afterwards, each new value is learnt (a few
+    learning steps on the window preceding it) and the next value is
+    forecast. Only the last N values are kept.
+
+    When a value falls outside the range of the data, the normalization is
+    extended and both the kept window and the first layer of the network are
+    rescaled to it, so the network doesn't have to learn everything again.
+    """
+
+    def __init__(self, config, steps=1, growth=.1):
+        """
+        config  network configuration; its data is the warm-up part of the
+                series (at least N + 1 values), learnt for config['runs']
+                steps (or until the error is small enough)
+        steps   number of learning steps done for each new value
+        growth  see normalizer.RunningNormalizer; None keeps the range of
+                the warm-up values
+        """
+        config = dict(config)
+        config['baseName'] = None
+        config['outputs'] = 1 # only the next value is learnt
+        config['horizon'] = 1
+        config['validation'] = 0 # the whole warm-up is learnt
+        config['ensemble'] = 1
+        data = config['data']
+        dom_min, dom_max = network.domain(config['activation'])
+        if growth is None:
+            n = normalizer.Normalizer(min(data), max(data), dom_min, dom_max)
+        else:
+            n = normalizer.RunningNormalizer(min(data), max(data),
+                    dom_min, dom_max, growth)
+        config['normalized'] = (n, map(n.normalize, data))
+        self._refit = growth is not None
+        self._steps = steps
+        self._nw = network.Network(config, None, None)
+        r = None
+        while not r:
+            r = self._nw.learn_step()
+        self._forecast = r['predicted']
+
+        self._n = n
+        N = config['N']
+        self._window = collections.deque(config['normalized'][1][-N:], N)
+
+    def forecast(self):
+        """
+        Returns the forecast of the next value.
+        """
+        return self._forecast
+
+    def update(self, value):
+        """
+        Learns a new value of the series and returns the forecast of the
+        next one.
+        """
+        if self._refit:
+            t = self._n.update(value)
+            if t:
+                a, b = t
+                for i in range(len(self._window)):
+                    self._window[i] = a * self._window[i] + b
+                self._nw.rescale_inputs(a, b)
+        x = self._n.normalize(value)
+        pattern = list(self._window)
+        for i in range(self._steps):
+            self._nw.learn_pattern(pattern, x)
+        self._window.append(x)
+        self._forecast = self._nw.forecast(list(self._window))
+        return self._forecast
+
+    def forecasts(self, values):
+        """
+        Learns the values given by an iterator (possibly without end),
+        yielding the forecast of the next value after each one.
+        """
+        for v in values:
+            yield self.update(v)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Profiling of the learning.
+
+The time spent in each phase (forward pass, backward pass, logging, drawing
+and saving) is measured by wrapping the methods doing them when the network
+is built, so a network which is not profiled pays nothing. The times are
+summed for the whole learning and for each learning step. A range of
+learning steps can also be profiled with cProfile, the stats being dumped
+to a file (read them with the pstats module).
+
+The phases are measured inclusively: logging done while presenting a
+pattern (the most detailed trace) is counted in both phases.
+"""
+
+import cProfile
+import time
+
+PHASES = ('forward', 'backward', 'logging', 'graph', 'save')
+
+def summary(totals):
+    """
+    Returns a table with the time spent in each phase, as text.
+
+    totals  the totals of a Profiler
+    """
+    lines = ['{0:<10}  {1:>10}  {2:>10}  {3:>12}'.format('phase', 'seconds',
+        'calls', 'us per call')]
+    for p in PHASES:
+        t = totals[p]
+        per = '{0:.4}'.format(1e6 * t['seconds'] / t['calls']) \
+                if t['calls'] else '-'
+        lines.append('{0:<10}  {1:>10.4}  {2:>10}  {3:>12}'.format(p,
+            t['seconds'], t['calls'], per))
+    return '\n'.join(lines) + '\n'
+
+class Profiler(object):
+    """
+    Sums the time spent in each phase of the learning.
+    """
+
+    def __init__(self, steps=None, fName=None):
+        """
+        steps   (first, last) learning steps (counted from 1, like in the
+                errors file) profiled with cProfile, None for none
+        fName   file where the cProfile stats are dumped (None to not use
+                cProfile at all)
+        """
+        self._totals = dict((p, [0.0, 0]) for p in PHASES)
+        self._epoch = dict.fromkeys(PHASES, 0.0)
+        self._epochs = []
+        self._steps = steps if fName else None
+        self._fName = fName
+        self._cprofile = None
+
+    def wrap(self, phase, f):
+        """
+        Returns a function doing the same as f, adding its time to phase.
+        """
+        total = self._totals[phase]
+        epoch = self._epoch
+        def timed(*args, **kwargs):
+            start = time.time()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                t = time.time() - start
+                total[0] += t
+                total[1] += 1
+                epoch[phase] += t
+        return timed
+
+    def wrap_step(self, f, done):
+        """
+        Returns a function doing a learning step like f, which also ends the
+        times of the step and starts or stops cProfile.
+
+        done    function returning the number of learning steps done
+        """
+        def step(*args, **kwargs):
+            n = done() + 1
+            if self._steps and not self._cprofile and \
+                    self._steps[0] <= n <= self._steps[1]:
+                self._cprofile = cProfile.Profile()
+                self._cprofile.enable()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self._epochs.append(dict(self._epoch))
+                for p in PHASES:
+                    self._epoch[p] = 0.0
+                if self._cprofile and n >= self._steps[1]:
+                    self._dump()
+        return step
+
+    def close(self):
+        """
+        Stops cProfile, if it is still running, dumping its stats.
+        """
+        if self._cprofile:
+            self._dump()
+
+    def _dump(self):
+        """
+        Stops cProfile and dumps its stats. The range is not profiled again.
+        """
+        self._cprofile.disable()
+        self._cprofile.dump_stats(self._fName)
+        self._cprofile = None
+        self._steps = None
+
+    def totals(self):
+        """
+        Returns the time spent in each phase: a dictionary with, for each
+        phase, the seconds ('seconds') and the number of calls ('calls').
+        """
+        return dict((p, {'seconds': s, 'calls': c})
+                for (p, (s, c)) in self._totals.items())
+
+    def epochs(self):
+        """
+        Returns the seconds spent in each phase during each learning step,
+        a dictionary for each step (drawing is counted in the step after).
+        """
+        return self._epochs
+
+    def short(self):
+        """
+        Returns a one line summary: the share of each phase of the time.
+        """
+        total = sum(s for (s, c) in self._totals.values())
+        if not total:
+            return ''
+        return ' '.join('{0} {1:.0%}'.format(p, self._totals[p][0] / total)
+                for p in PHASES if self._totals[p][1])
@@ -3,97 +3,230 @@
 # (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
 #
 
+"""
+Saving of the results. The files are written (and the plots drawn) by a
+pool of writer threads, so that the caller can go on; wait() waits for all
+of them.
+"""
+
 from globaldefs import *
 
-import gtk
+import model
 import os
+import subprocess
+import threading
+from multiprocessing.pool import ThreadPool
+
+try:
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+except ImportError:
+    Figure = None # plots done by gnuplot, if installed
+
+WRITERS = 2 # threads writing the files
+
+_pool = None
+_pool_pid = None # the pool is not inherited by forked processes
+_pending = []
+_lock = threading.Lock()
+_plot_lock = threading.Lock() # matplotlib is not thread safe
+
+def submit(f, *args):
+    """
+    Runs f(*args) in the writer pool. Returns the pending result (a
+    multiprocessing AsyncResult), which wait() also waits for.
+    """
+    global _pool, _pool_pid
+    with _lock:
+        if _pool_pid != os.getpid():
+            _pool = ThreadPool(WRITERS)
+            _pool_pid = os.getpid()
+            del _pending[:]
+        r = _pool.apply_async(f, args)
+        _pending.append(r)
+    return r
+
+def _collect(results):
+    """
+    Waits for some writes. Returns the errors of the failed ones.
+    """
+    errors = []
+    for r in results:
+        try:
+            r.get()
+        except Exception as e:
+            errors.append(str(e))
+    return errors
+
+def wait():
+    """
+    Waits until all the results saved so far are written.
+
+    return  list of error messages, one for each file which couldn't be
+            written or plotted
+    """
+    with _lock:
+        pending = _pending[:]
+        del _pending[:]
+    return _collect(pending)
+
+def _plot(pngName, curves, script):
+    """
+    Plots some curves to a png file, in process with matplotlib if it is
+    installed, otherwise with gnuplot. Raises IOError if not plotted.
+
+    pngName     name of the png file
+    curves      list of (xs, ys, title, with_lines) tuples
+    script      the same plot as a gnuplot plot command
+    """
+    if Figure:
+        with _plot_lock:
+            fig = Figure()
+            canvas = FigureCanvasAgg(fig)
+            ax = fig.add_subplot(111)
+            for (xs, ys, title, with_lines) in curves:
+                ax.plot(xs, ys, '-' if with_lines else '+', label=title)
+            ax.legend()
+            canvas.print_png(pngName)
+        return
+
+    try:
+        with open(pngName, 'wb') as f:
+            p = subprocess.Popen(['gnuplot'], stdin=subprocess.PIPE,
+                    stdout=f, stderr=subprocess.PIPE)
+            err = p.communicate('set term png; {0}\n'.format(script))[1]
+    except OSError:
+        os.remove(pngName)
+        raise IOError("{0} not plotted: neither matplotlib nor gnuplot is "
+                "installed".format(pngName))
+    if p.returncode:
+        os.remove(pngName)
+        raise IOError("{0} not plotted: {1}".format(pngName, err.strip()))
 
 class Save(object):
     """
     This will save all data gathered while learning and predicting.
     """
-    def __init__(self, network, results):
+    def __init__(self, network, results, forecast, spread=None):
+        """
+        network     the network which learnt
+        results     outputs of the network for each pattern of the series
+        forecast    values forecast after the series
+        spread      spread of each forecast value over the members of an
+                    ensemble, None for a single network
+        """
         self._nw = network
         self._baseName = self._nw.baseName()
         self._rs = results
+        self._forecast = forecast
+        self._spread = spread
+        self._rms = list(self._nw._rms)
+        self._hrms = list(self._nw._hrms)
+        self._vrms = list(self._nw._vrms)
+        self._model = self._nw.model()
+        self._jobs = []
 
     def save_all(self):
         """
-        Saves all data.
+        Saves all data. Only the drawing of the network is taken right away
+        (in the caller's thread, the GUI one), the files are written in the
+        background.
+        """
+        img = self._nw_image()
+        self._jobs = [
+                submit(self._save_nw_to_img, img),
+                submit(self._save_nw_to_matrix),
+                submit(self._save_nw_to_binary),
+                submit(self._save_rms),
+                submit(self._save_values)]
+
+    def wait(self):
+        """
+        Waits until the files of this save are written. Returns the errors,
+        like the module's wait().
         """
-        self._save_nw_to_img()
-        self._save_nw_to_matrix()
-        self._save_rms()
-        self._save_values()
+        return _collect(self._jobs)
 
-    def _save_nw_to_img(self):
+    def _nw_image(self):
         """
-        Saves the network to a png file.
+        Takes the drawing of the network, None if the network was not drawn
+        (headless learning).
         """
-        fName = self._baseName + NETWORK_SUFFIX
         drawable = self._nw.drawable()
+        if not drawable:
+            return None
+
+        import gtk # not imported at module level to run without a display
         cmap = drawable.get_colormap()
         pbuf = gtk.gdk.Pixbuf(gtk.gdk.COLORSPACE_RGB, True, 8,
                 *drawable.get_size())
-        pbuf = pbuf.get_from_drawable(drawable, cmap, 0, 0, 0, 0,
+        return pbuf.get_from_drawable(drawable, cmap, 0, 0, 0, 0,
                 *drawable.get_size())
-        pbuf.save(fName, 'png')
+
+    def _save_nw_to_img(self, pbuf):
+        """
+        Saves the drawing of the network to a png file.
+        """
+        if pbuf:
+            pbuf.save(self._baseName + NETWORK_SUFFIX, 'png')
 
     def _save_nw_to_matrix(self):
         """
-        Saves the weights from the network to a file.
+        Saves the weights from the network to a file, as a table.
         """
-        ns = self._nw.neurons()
-        lname = max(map(lambda n:len(n.name()), ns)) + 4
-        l = max(lname, 7)
-        t = (1 + len(ns)) * (l + 1) + 1
-        sep = '{0:-^{1}}'.format('',t)
-        fName =self._baseName + NETWORK_MATRIX_SUFFIX
+        with open(self._baseName + NETWORK_MATRIX_SUFFIX, 'w') as f:
+            f.write(self._model.table())
 
-        with open(fName, 'w') as f:
-            f.write(sep + '\n')
-            s = "|{0:^{1}}|".format('', lname)
-            for n in ns:
-                s += "{0:^{1}}|".format(n.name(), l)
-            f.write(''.join(s) + '\n')
-            f.write(sep + '\n')
-
-            for n in ns:
-                nd = {}
-                for (nn, w) in zip(n.inputs(), n.weights()):
-                    nd[nn.name()] = w + 0.0
-                s = "|{0:^{1}}|".format(n.name(), lname)
-                for nn in ns:
-                    if nn in n.inputs():
-                        s += "{0:^+{1}.2}|".format(nd[nn.name()], l)
-                    else:
-                        s += "{0:^{1}}|".format('', l)
-                f.write(s + '\n')
-                f.write(sep + '\n')
+    def _save_nw_to_binary(self):
+        """
+        Saves the network to a binary file, which can be loaded back (see
+        model.load).
+        """
+        model.save(self._baseName + NETWORK_BINARY_SUFFIX, self._model)
 
     def _save_rms(self):
         """
-        Saves a list of errors per epoch and does a plot of them. The plot is
-        done via gnuplot, which must be installed.
+        Saves a list of errors per epoch and does a plot of them. If the
+        network has more outputs, the error of each one follows the total.
+        The validation errors (if some windows were held out) are saved in
+        another file and plotted together with the others.
         """
-        rms = self._nw._rms
+        rms = self._rms
         l = len(rms)
         fName = self._baseName + RMS_FILE_SUFFIX
 
         with open(fName, 'w') as f:
             for (i, r) in zip(range(l), rms):
-                f.write('{0}\t{1:.5}\n'.format(i + 1, r))
+                f.write('{0}\t{1:.5}'.format(i + 1, r))
+                if self._hrms:
+                    f.write(''.join('\t{0:.5}'.format(h) for h in self._hrms[i]))
+                f.write('\n')
+
+        xs = range(1, l + 1)
+        curves = [(xs, rms, 'Error', True)]
+        script = 'plot "{0}" using 1:2 title "Error" with lines'.format(fName)
+        for h in range(len(self._hrms[0]) if self._hrms else 0):
+            title = 'Error t+{0}'.format(h + 1)
+            curves.append((xs, [r[h] for r in self._hrms], title, True))
+            script += ', "{0}" using 1:{1} title "{2}" with lines'.format(
+                    fName, h + 3, title)
 
-        pngName = self._baseName + RMS_PLOT_SUFFIX
-        cmd = \
-            'echo \'set term png; plot "{0}" using 1:2 title "Error" ' \
-            'with lines\' | gnuplot > {1}'.format(fName, pngName)
-        os.system(cmd)
+        if self._vrms:
+            vName = self._baseName + VALIDATION_FILE_SUFFIX
+            with open(vName, 'w') as f:
+                for (i, r) in self._vrms:
+                    f.write('{0}\t{1:.5}\n'.format(i, r))
+            curves.append(([i for (i, r) in self._vrms],
+                [r for (i, r) in self._vrms], 'Validation', True))
+            script += ', "{0}" using 1:2 title "Validation" with lines'.format(
+                    vName)
+        _plot(self._baseName + RMS_PLOT_SUFFIX, curves, script)
 
     def _save_values(self):
         """
-        Saves the original values and the obtained values and does a plot of
-        them. Plot done via gnuplot, see above method.
+        Saves the original values, the obtained values and the forecast ones
+        (after the series, followed by their spread for an ensemble) and does
+        a plot of them.
         """
         N = self._nw._N
         odata = self._nw.orig_data()
@@ -107,12 +240,29 @@ class Save(object):
             for (i, d, r) in zip(range(N, n+1), odata[N:], self._rs):
                 f.write('{0}\t{1:.5}\t{2:.5}\n'.format(i + 1, d, r))
 
-            f.write('{0}\t-\t{1:.5}\n'.format(n + 2, self._rs[-1]))
+            for (i, r) in enumerate(self._forecast):
+                if self._spread:
+                    f.write('{0}\t-\t{1:.5}\t{2:.5}\n'.format(n + 2 + i, r,
+                        self._spread[i]))
+                else:
+                    f.write('{0}\t-\t{1:.5}\n'.format(n + 2 + i, r))
 
-        pngName = self._baseName + VAL_PLOT_SUFFIX
-        cmd = \
-            'echo \'set term png; plot "{0}" using 1:2 title "Inputs", ' \
-            '"{0}" using 1:3 title "Outputs" with lines \' | gnuplot ' \
-            '> {1}'.format(fName, pngName)
-        os.system(cmd)
+        # same points as in the file
+        m = min(n - N, len(self._rs))
+        xs = range(N + 1, N + m + 1) + range(n + 2, n + 2 + len(self._forecast))
+        ys = self._rs[:m] + list(self._forecast)
+        curves = [(range(1, n + 1), odata, 'Inputs', False),
+                (xs, ys, 'Outputs', True)]
+        script = 'plot "{0}" using 1:2 title "Inputs", "{0}" using 1:3 ' \
+                'title "Outputs" with lines'.format(fName)
+        if self._spread:
+            fxs = range(n + 2, n + 2 + len(self._forecast))
+            for (sign, title) in [(-1, 'Forecast - spread'),
+                    (1, 'Forecast + spread')]:
+                curves.append((fxs, [f + sign * s for (f, s) in
+                    zip(self._forecast, self._spread)], title, False))
+            script += ', "{0}" every ::{1} using 1:($3-$4) title ' \
+                    '"Forecast - spread", "{0}" every ::{1} using ' \
+                    '1:($3+$4) title "Forecast + spread"'.format(fName, N + m)
+        _plot(self._baseName + VAL_PLOT_SUFFIX, curves, script)
 
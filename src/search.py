@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Search for the best configuration of the network for a series (grid search
+or random search), learning the candidates in parallel.
+"""
+
+import itertools
+import math
+import multiprocessing
+import random
+
+import activations
+import network
+import settings
+
+# Data shared by all the workers, set when the pool is started (inherited, not
+# copied, when the workers are forked): the base configuration, the series,
+# the number of values used for learning and, for each range of activation
+# functions, the normalizer and the normalized series.
+_shared = None
+
+def parse_space(specs):
+    """
+    Parses the values to try for each configuration key.
+
+    specs   list of KEY=V1,V2,... or KEY=LOW:HIGH strings (the range can only
+            be used for random search)
+    return  dictionary from key to list of values or (low, high) tuple
+    """
+    space = {}
+    for spec in specs:
+        key, sep, values = spec.partition('=')
+        if not sep or key not in settings.DEFAULTS:
+            raise ValueError("Invalid search option {0}".format(spec))
+        if ':' in values:
+            low, high = values.split(':')
+            space[key] = (_convert(key, low), _convert(key, high))
+        else:
+            space[key] = [_convert(key, v) for v in values.split(',')]
+    return space
+
+def _convert(key, value):
+    """
+    Converts a value read for a configuration key to the key's type.
+    """
+    t = type(settings.DEFAULTS[key])
+    if t is bool:
+        if value.lower() not in ('0', '1', 'false', 'true', 'no', 'yes'):
+            raise ValueError("Invalid value {0} for {1}".format(value, key))
+        return value.lower() in ('1', 'true', 'yes')
+    try:
+        return t(value)
+    except ValueError:
+        raise ValueError("Invalid value {0} for {1}".format(value, key))
+
+def grid(space):
+    """
+    Returns all the combinations of values from the search space.
+    """
+    keys = sorted(space)
+    for k in keys:
+        if isinstance(space[k], tuple):
+            raise ValueError("Grid search needs a list of values for {0}".format(k))
+    return [dict(zip(keys, vs))
+            for vs in itertools.product(*[space[k] for k in keys])]
+
+def sample(space, count):
+    """
+    Returns count random combinations of values from the search space.
+    Ranges of integers and floats are sampled uniformly.
+    """
+    candidates = []
+    for i in range(count):
+        c = {}
+        for (k, vs) in space.items():
+            if not isinstance(vs, tuple):
+                c[k] = random.choice(vs)
+            elif isinstance(vs[0], int):
+                c[k] = random.randint(*vs)
+            else:
+                c[k] = random.uniform(*vs)
+        candidates.append(c)
+    return candidates
+
+def prepare(config, holdout):
+    """
+    Normalizes the series once for each range of activation functions.
+
+    config  base configuration (with the series)
+    holdout number of values at the end of the series which are not learnt,
+            used to rank the candidates
+    return  the data to be shared by the workers
+    """
+    data = config['data']
+    P = len(data) - holdout
+    normalized = {}
+    for dom in set(a.domain for a in activations.ACTIVATIONS.values()):
+        n, ndata = network.normalize(data[:P], *dom)
+        normalized[dom] = (n, tuple(map(n.normalize, data)))
+    return {'config': config, 'learn': P, 'normalized': normalized}
+
+def _init(shared):
+    """
+    Initializes a worker process.
+    """
+    global _shared
+    _shared = shared
+    settings.init_worker()
+
+def evaluate(candidate):
+    """
+    Learns the series with a candidate configuration.
+
+    return  dictionary with the candidate ('config'), the learning RMS
+            ('rms'), the RMS over the held out values ('holdout', None if
+            there are none), both in the scale of the series, and the
+            prediction of the first value after the learnt ones
+            ('predicted'); or with the candidate and an 'error' message
+    """
+    config = dict(_shared['config'])
+    config.update(candidate)
+    config['baseName'] = None
+    P = _shared['learn']
+    try:
+        n, ndata = _shared['normalized'][network.domain(config['activation'])]
+    except ValueError as e:
+        return {'config': candidate, 'error': str(e)}
+    # only the values before the held out ones are learnt (and checked)
+    config['data'] = config['data'][:P]
+    config['normalized'] = (n, ndata[:P])
+    for (fatal, text) in settings.check_config(config):
+        if fatal:
+            return {'config': candidate, 'error': text}
+
+    nw = network.Network(config, None, None)
+    r = None
+    while not r:
+        r = nw.learn_step()
+
+    holdout = None
+    data, N = _shared['config']['data'], config['N']
+    if P < len(data):
+        errs = [nw.forecast(ndata[t-N:t]) - data[t] for t in range(P, len(data))]
+        holdout = math.sqrt(sum(e * e for e in errs) / len(errs))
+
+    return {'config': candidate, 'rms': n.recast_error(r['err']),
+            'holdout': holdout, 'predicted': r['predicted']}
+
+def search(config, candidates, holdout=0, rank='rms', jobs=None):
+    """
+    Learns the series with all candidate configurations, in parallel.
+
+    config      base configuration (with the series)
+    candidates  list of dictionaries overriding the base configuration
+    holdout     number of values at the end of the series which are not
+                learnt
+    rank        key used to sort the results: 'rms' or 'holdout'
+    jobs        number of worker processes (None = one per CPU)
+    return      list of results (see evaluate), best first, failed last
+    """
+    shared = prepare(config, holdout)
+    pool = multiprocessing.Pool(jobs, _init, (shared,))
+    results = pool.map(evaluate, candidates, 1)
+    pool.close()
+    pool.join()
+    return sorted(results,
+            key=lambda r: r[rank] if 'error' not in r else float('inf'))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+# Settings shared by the configuration dialog and the command line. Nothing
+# here needs a display.
+#
+
+import random
+
+import activations
+import network
+
+from globaldefs import *
+
+# Same initial values as the ones from the configuration dialog.
+DEFAULTS = {
+        'runs': 1000,
+        'N': 2,
+        'h1': 2,
+        'h2': 2,
+        'activation': 'log',
+        'minW': -1.0,
+        'maxW': 1.0,
+        'momentum': False,
+        'recurrent': False,
+        'engine': 'units',
+        'batch': 1,
+        'trace': TRACE_OFF,
+        'history': HISTORY_OFF,
+        'alpha': .2,
+        'eta': .1,
+        'min_rms': .01,
+        'min_delta_rms': 0.0,
+        'checkpoint': 0,
+        'checkpoint_time': 0.0,
+        'horizon': 1,
+        'outputs': 1,
+        'ensemble': 1,
+        'validation': 0.0,
+        'validate_every': 5,
+        'patience': 10,
+        'profile': False,
+        'cprofile': None,
+        }
+
+# learning engines: the object graph, the vectorized one (needs numpy) and
+# the lean one (pure Python)
+ENGINES = ('units', 'numpy', 'lean')
+
+def read_data(fName):
+    """
+    Reads the series from the first line of a file.
+
+    return  list of values, None if the file is invalid
+    """
+    try:
+        with open(fName) as f:
+            return map(float, f.readline().split())
+    except Exception as e:
+        return None
+
+def init_worker():
+    """
+    Initializes a worker process learning in parallel with others (batch
+    and search commands). The forked workers start with the same random
+    state, so they would all start from the same weights otherwise.
+    """
+    random.seed()
+
+def check_config(config):
+    """
+    Checks the read values for consistency, fixing the ones which can be
+    ignored.
+
+    return  list of (fatal, message) tuples, one for each problem found
+    """
+    problems = []
+
+    if config['minW'] > config['maxW'] - .1:
+        problems.append((False, "Invalid interval for weights, ignored"))
+        config['minW'] = -1
+        config['maxW'] = 1
+
+    if config['engine'] == 'numpy' and not network.engine:
+        problems.append((False, "numpy is missing, using the object engine"))
+        config['engine'] = 'units'
+
+    if config['ensemble'] > 1 and not network.engine:
+        problems.append((False, "numpy is missing, learning a single network"))
+        config['ensemble'] = 1
+
+    if config['ensemble'] > 1 and config['batch'] != 1:
+        problems.append((False, "The networks of an ensemble learn online, using online learning"))
+        config['batch'] = 1
+
+    if config['batch'] != 1 and config['engine'] != 'numpy':
+        problems.append((False, "Batch learning needs the vectorized engine, using online learning"))
+        config['batch'] = 1
+
+    if config['history'] and not network.history:
+        problems.append((False, "numpy is missing, no binary history saved"))
+        config['history'] = HISTORY_OFF
+
+    if config['trace'] >= TRACE_WEIGHTS and (config['engine'] != 'units' or
+            config['ensemble'] > 1):
+        problems.append((False, "Only the object engine traces every weight, tracing the steps"))
+        config['trace'] = TRACE_STEPS
+
+    if config['h1'] == 0 and config['h2'] != 0:
+        problems.append((False, "Still a network with a single layer"))
+
+    if config['N'] < 1:
+        problems.append((True, "Order should be at least 1"))
+
+    if config['ensemble'] < 1:
+        problems.append((True, "The ensemble needs at least one network"))
+
+    if config['horizon'] < 1:
+        problems.append((True, "Should forecast at least one value"))
+
+    if config['outputs'] < 1:
+        problems.append((True, "The network needs at least one output"))
+    else:
+        if config['horizon'] < config['outputs']:
+            problems.append((False, "Forecasting the values of all the outputs"))
+            config['horizon'] = config['outputs']
+        if len(config['data']) < config['N'] + config['outputs']:
+            problems.append((True, "Series too short for the order and outputs"))
+        elif not 0 <= config['validation'] < 1:
+            problems.append((True, "The validation fraction should be in [0, 1)"))
+        else:
+            windows = len(config['data']) - config['N'] - config['outputs'] + 1
+            if network.held_out(windows, config['validation']) >= windows:
+                problems.append((True, "Nothing left to learn after holding out the validation windows"))
+
+    if config['validate_every'] < 1:
+        problems.append((False, "Validating after every step"))
+        config['validate_every'] = 1
+
+    if config['patience'] < 0:
+        problems.append((False, "Negative patience, never stopping early"))
+        config['patience'] = 0
+
+    if config['cprofile'] and not 1 <= config['cprofile'][0] <= config['cprofile'][1]:
+        problems.append((True, "Invalid range of steps to profile"))
+
+    if config['activation'] not in activations.ACTIVATIONS:
+        problems.append((True, "Unknown activation function {0}".format(
+            config['activation'])))
+
+    return problems
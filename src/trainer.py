@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# (c) Mihai Maruseac, 341C3 (2011), mihai.maruseac@rosedu.org
+#
+
+"""
+Learning in a background thread, leaving the GUI free to redraw.
+"""
+
+import threading
+import time
+
+# seconds between two snapshots of the weights (and GUI redraws)
+INTERVAL = .04
+
+class Trainer(threading.Thread):
+    """
+    Learns a network in a worker thread, which never touches the GUI. The
+    GUI polls the progress and the latest snapshot of the weights and, when
+    the learning is done, finishes the network (in the GUI thread, since the
+    drawing of the network is saved).
+    """
+
+    def __init__(self, nw, interval=INTERVAL):
+        """
+        nw          network.Network to learn
+        interval    minimum number of seconds between two snapshots
+        """
+        super(Trainer, self).__init__()
+        self.daemon = True
+        self._nw = nw
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._snapshot = None
+        self._progress = 0
+        self._done = False
+        self._error = None
+
+    def network(self):
+        return self._nw
+
+    def run(self):
+        last = 0
+        try:
+            while not self._cancel.is_set():
+                done = self._nw.learn_epoch()
+                self._progress = self._nw.progress()
+                now = time.time()
+                if done or now - last >= self._interval:
+                    s = self._nw.snapshot()
+                    with self._lock:
+                        self._snapshot = s
+                    last = now
+                if done:
+                    break
+        except Exception as e:
+            self._error = e
+        self._done = True
+
+    def cancel(self):
+        """
+        Stops the learning (after the current step) and waits for the worker
+        to end. The network is closed, nothing is saved.
+        """
+        self._cancel.set()
+        self.join()
+        self._nw.close()
+
+    def snapshot(self):
+        """
+        Returns the latest snapshot of the weights (see Network.snapshot) or
+        None if there is no new one since the last call.
+        """
+        with self._lock:
+            s, self._snapshot = self._snapshot, None
+        return s
+
+    def progress(self):
+        return self._progress
+
+    def done(self):
+        """
+        Returns True if the learning is over (finished, cancelled or failed).
+        """
+        return self._done
+
+    def error(self):
+        """
+        Returns the exception which stopped the learning, None if none.
+        """
+        return self._error
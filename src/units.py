@@ -5,12 +5,17 @@
 
 """
 Holds all kind of neurons and their description.
+
+The units only compute: where and how they are drawn is kept by the
+grapher. They have no instance dictionary (__slots__), since a network can
+have many of them, and the neurons keep their weights in compact arrays.
 """
 
 from globaldefs import *
 
+from array import array
+
 import logging
-import pango
 import random
 
 _logger = logging.getLogger(LOGNAME)
@@ -20,11 +25,11 @@ class Unit(object):
     Simple unit from network. Holds a single value and doesn't learn anything
     at all.
     """
+    __slots__ = ('_name', '_value', '_err')
+
     def __init__(self, name='', value=None):
         self._name = name
         self._value = value
-        self._x = 0
-        self._y = 0
         self._err = 0
 
     def name(self):
@@ -33,14 +38,6 @@ class Unit(object):
     def value(self):
         return self._value
 
-    def place(self, x, y):
-        self._x = x
-        self._y = y
-
-    def draw(self, pbuff, gc, size, pcon):
-        self._draw_image(pbuff, gc, size)
-        self._draw_label(pbuff, gc, size, pcon)
-
     def compute_output(self):
         pass
 
@@ -59,53 +56,25 @@ class Unit(object):
     def recurrent_weight(self):
         return None
 
-    def _draw_image(self, pbuff, gc, size):
-        pbuff.draw_arc(gc, False, self._x, self._y, size, size, 0, 64 * 360)
-
-    def _draw_label(self, pbuff, gc, size, pcon):
-        l = pango.Layout(pcon)
-        self._draw_label_text(l)
-        pbuff.draw_layout(gc, self._x + size / 4, self._y + size / 4, l)
-
-    def _draw_label_text(self, l):
-        l.set_text(self._name)
-
-    def exit_point(self, size):
-        return (self._x + size, self._y + size / 2)
-
-    def entry_point(self, size):
-        return (self._x, self._y + size / 2)
-
 class Fixed(Unit):
     """
     A unit holding a fixed value, keeping that value constant and not
     learning.
     """
+    __slots__ = ()
+
     def __init__(self, name='', value=1):
         super(Fixed, self).__init__(name, value)
 
-    def _draw_label_text(self, l):
-        l.set_text("1")
-
-    def _draw_image(self, pbuff, gc, size):
-        pbuff.draw_rectangle(gc, False, self._x, self._y, size, size)
-
 class Pattern(Unit):
     """
     A unit for pattern feeding the neural network.
     """
+    __slots__ = ()
+
     def set(self, value):
         self._value = value
 
-    def _draw_label_text(self, l):
-        l.set_text(">")
-
-    def _draw_image(self, pbuff, gc, size):
-        ps = [(self._x, self._y),
-                (self._x + size, self._y + size / 2),
-                (self._x, self._y + size)]
-        pbuff.draw_polygon(gc, False, ps)
-
 class Output(Unit):
     """
     A unit for feeding the desired output to the neural network and starting
@@ -114,6 +83,8 @@ class Output(Unit):
     self.value() will return the actual output
     self.desired() / self.set_desired() work with desired values.
     """
+    __slots__ = ('_n', '_desired')
+
     def __init__(self, n, name=''):
         super(Output, self).__init__(name, None)
         self._n = n
@@ -148,35 +119,26 @@ class Output(Unit):
         """
         self._n.report_error(self._err)
 
-    def _draw_label_text(self, l):
-        l.set_text("=")
-
-    def _draw_image(self, pbuff, gc, size):
-        ps = [(self._x + size - 10, self._y),
-                (self._x - 10, self._y + size / 2),
-                (self._x + size - 10, self._y + size)]
-        pbuff.draw_polygon(gc, False, ps)
-
-    def entry_point(self, size):
-        return (self._x - 10, self._y + size / 2)
-
 class Neuron(Unit):
     """
     Actual neuron.
 
     self.value() will return the output of the neuron
     """
-    def __init__(self, minW, maxW, f, df, momentum, name, eta, alpha):
+    __slots__ = ('_min', '_max', '_weights', '_inputs', '_activation',
+            '_factor', '_momentum', '_ow', '_ETA', '_ALPHA', '_selfw', '_sow')
+
+    def __init__(self, minW, maxW, activation, momentum, name, eta, alpha):
         super(Neuron, self).__init__(name, 0)
         self._min = minW
         self._max = maxW
-        self._weights = []
+        self._weights = array('d')
         self._inputs = []
-        self._f = f
-        self._df = df
+        self._activation = activation
+        self._factor = 0
         self._momentum = momentum
         if self._momentum:
-            self._ow = []
+            self._ow = array('d')
         self._ETA = eta
         self._ALPHA = alpha
 
@@ -186,6 +148,65 @@ class Neuron(Unit):
     def weights(self):
         return self._weights
 
+    def set_weights(self, weights, selfw=None):
+        """
+        Replaces the weights of this neuron (and the recurrent one, if the
+        neuron is recurrent).
+        """
+        self._weights[:] = array('d', weights)
+        if self._selfw is not None:
+            self._selfw = selfw
+
+    def momentum_weights(self):
+        """
+        Returns the last deltas of the weights and of the recurrent weight
+        (None if not recurrent), used for the momentum; None if the neuron
+        doesn't use momentum.
+        """
+        if not self._momentum:
+            return None
+        return (self._ow, self._sow if self._selfw is not None else None)
+
+    def set_momentum_weights(self, ow, sow=None):
+        """
+        Replaces the last deltas of the weights (and of the recurrent one, if
+        the neuron is recurrent). Only for neurons using momentum.
+        """
+        self._ow[:] = array('d', ow)
+        if self._selfw is not None:
+            self._sow = sow
+
+    def state(self):
+        """
+        Returns what the neuron carries from one pattern to the next: its
+        output and its error (the error coming from the recurrent edge).
+        """
+        return (self._value, self._err)
+
+    def set_state(self, value, err):
+        """
+        Restores the output and the error returned by state.
+        """
+        self._value = value
+        self._err = err
+
+    def rescale_inputs(self, a, b):
+        """
+        Changes the weights such that the neuron computes the same output
+        when each input except the last one (the bias) is replaced by a * x +
+        b. Exact only if the new weights are not clipped to [-1, 1].
+        """
+        ws = [self._weights]
+        if self._momentum:
+            ws.append(self._ow)
+        for w in ws:
+            s = sum(w[:-1])
+            for i in range(len(w) - 1):
+                w[i] /= a
+            w[-1] -= b * s / a
+        for i in range(len(self._weights)):
+            self._weights[i] = max(-1, min(1, self._weights[i]))
+
     def connect(self, i):
         """
         Connects a unit to the input of this neuron.
@@ -215,15 +236,14 @@ class Neuron(Unit):
     def compute_output(self):
         """
         Computes the output of this neuron, depending on its inputs and its
-        weights.
+        weights, and the factor used when learning from the error.
         """
         s = 0
         if self._selfw:
             s += self._selfw * self._value
         for (w, i) in zip(self._weights, self._inputs):
             s += w * i.value()
-        self._value = self._f(s)
-        _logger.info('Neuron {0}: activation: {1}'.format(self._name, self._value))
+        self._value, self._factor = self._activation.output_and_factor(s)
 
     def report_error(self, err):
         """
@@ -231,50 +251,70 @@ class Neuron(Unit):
         trying to learn something and report the error to the previous layer.
         """
         self._err += err
-        _logger.info('Neuron {0}: Received error: {1}'.format(self._name, err))
 
     def report_and_learn_from_error(self):
         """
         Reports the total error to the previous layer, learns from the error
         and resets it.
         """
-        _logger.info('Neuron {0}: Total error: {1}'.format(self._name, self._err))
-
         for (w, i) in zip(self._weights, self._inputs):
             i.report_error(w * self._err)
         if self._selfw:
             e = self._selfw * self._err
 
+        g = self._ETA * self._err * self._factor
         for i in range(len(self._weights)):
-            w, inp = self._weights[i], self._inputs[i]
-            delta = self._ETA * self._err * self._df(self._value) * inp.value()
+            delta = g * self._inputs[i].value()
             if self._momentum:
                 delta += self._ETA * self._ALPHA * self._ow[i]
                 self._ow[i] = delta
-            _logger.info('Neuron {0}: delta weight{1}: {2}'.format(self._name, i, delta))
             self._weights[i] -= delta
             if self._weights[i] < -1:
                 self._weights[i] = -1
             if self._weights[i] > 1:
                 self._weights[i] = 1
-            _logger.info('Neuron {0}: weight{1}: {2}'.format(self._name, i, self._weights[i]))
         if self._selfw:
-            delta = self._ETA * self._err * self._df(self._value) * self._value
+            delta = g * self._value
             if self._momentum:
                 delta += self._ETA * self._ALPHA * self._sow
                 self._sow = delta
-            _logger.info('Neuron {0}: delta self weight: {1}'.format(self._name, self._selfw))
             self._selfw -= delta
             if self._selfw < -1:
                 self._selfw = -1
             if self._selfw > 1:
                 self._selfw = 1
-            _logger.info('Neuron {0}: self weight: {1}'.format(self._name, self._selfw))
 
         self._err = 0
         if self._selfw:
             self.report_error(e)
 
-    def _draw_label_text(self, l):
-        l.set_text("")
+class TracedNeuron(Neuron):
+    """
+    Neuron logging every step of its computations: activation, errors and
+    the change of each weight. Only used for the most detailed trace level,
+    the plain Neuron doesn't pay anything for it.
+    """
+    __slots__ = ()
+
+    def compute_output(self):
+        super(TracedNeuron, self).compute_output()
+        _logger.info('Neuron {0}: activation: {1}'.format(self._name, self._value))
 
+    def report_error(self, err):
+        super(TracedNeuron, self).report_error(err)
+        _logger.info('Neuron {0}: Received error: {1}'.format(self._name, err))
+
+    def report_and_learn_from_error(self):
+        """
+        Same as for Neuron, logging the change of each weight (after the
+        clipping to [-1, 1]).
+        """
+        _logger.info('Neuron {0}: Total error: {1}'.format(self._name, self._err))
+        ows, osw = self._weights[:], self._selfw
+        super(TracedNeuron, self).report_and_learn_from_error()
+        for (i, (ow, w)) in enumerate(zip(ows, self._weights)):
+            _logger.info('Neuron {0}: delta weight{1}: {2}'.format(self._name, i, ow - w))
+            _logger.info('Neuron {0}: weight{1}: {2}'.format(self._name, i, w))
+        if self._selfw:
+            _logger.info('Neuron {0}: delta self weight: {1}'.format(self._name, osw - self._selfw))
+            _logger.info('Neuron {0}: self weight: {1}'.format(self._name, self._selfw))